@@ -0,0 +1,68 @@
+"""Compare the extraction backends on a directory of PDFs.
+
+For every backend, reports the extraction time and the share of documents
+whose tables are identical to PyMuPDF's table finder. Use it to decide
+which producers can be routed to the text-layer backend, see
+`BackendSelector(text_producers=...)`.
+
+Usage:
+    python benchmarks/backends.py /path/to/pdfs
+"""
+import argparse
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from loguru import logger
+from form16_parser import PyMuPDFBackend, TextLayerBackend
+from form16_parser.pdf import PDF
+
+
+def extract(filepath, backend):
+    start = time.perf_counter()
+    pdf = PDF(filepath, backend=backend)
+    try:
+        tables = [table.rows for table in pdf.tables]
+    finally:
+        pdf.clear()
+    return time.perf_counter() - start, tables, pdf.producer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path)
+    args = parser.parse_args()
+
+    logger.remove()
+    filepaths = sorted(args.directory.glob("*.pdf"))
+    if not filepaths:
+        raise SystemExit(f"No PDF files in {args.directory}")
+
+    reference = PyMuPDFBackend()
+    candidates = [TextLayerBackend()]
+    elapsed = defaultdict(float)
+    # producer -> backend -> [documents, identical]
+    agreement = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for filepath in filepaths:
+        seconds, expected, producer = extract(filepath, reference)
+        elapsed[reference.name] += seconds
+        for backend in candidates:
+            seconds, tables, _ = extract(filepath, backend)
+            elapsed[backend.name] += seconds
+            counts = agreement[producer][backend.name]
+            counts[0] += 1
+            counts[1] += tables==expected
+
+    print(f"{len(filepaths)} documents")
+    print(f"{'backend':<10}{'docs/s':>10}")
+    for name, seconds in elapsed.items():
+        print(f"{name:<10}{len(filepaths) / seconds:>10.1f}")
+    print()
+    print(f"{'producer':<40}{'backend':<10}{'identical':>12}")
+    for producer, backends in sorted(agreement.items()):
+        for name, (documents, identical) in backends.items():
+            print(f"{producer[:39]:<40}{name:<10}{f'{identical}/{documents}':>12}")
+
+
+if __name__ == "__main__":
+    main()
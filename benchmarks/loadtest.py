@@ -0,0 +1,275 @@
+"""Load test the parser with N concurrent clients.
+
+Replays the PDFs of a directory against a target and reports throughput,
+latency percentiles, CPU utilization per core and peak RSS for every
+client count:
+
+- `parse`: N client processes calling `Parser.parse`, one document at a time;
+- `batch`: `parse_many` with N process workers. Latencies are estimated
+  from the parse duration histogram of `METRICS`;
+- `http`: N client threads POSTing every document to `--url`.
+
+Results are saved as JSON to compare runs across versions and worker counts.
+
+Usage:
+    python benchmarks/loadtest.py /path/to/pdfs --target parse --clients 1 2 4 8 \\
+        [--repeat 3] [--url http://localhost:8000/parse] [--label v0.1.0] [--output run.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib import metadata
+from pathlib import Path
+
+from loguru import logger
+from form16_parser import METRICS, build_parser, parse_many
+from form16_parser.metrics import STAGE_DURATION
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+TARGETS = ("parse", "batch", "http")
+
+
+def cpu_times():
+    """(busy, total) jiffies per core, from /proc/stat. `None` elsewhere."""
+    try:
+        with open("/proc/stat") as fp:
+            lines = [line.split() for line in fp if line.startswith("cpu") and line[3].isdigit()]
+    except OSError:
+        return None
+    times = []
+    for fields in lines:
+        values = [int(v) for v in fields[1:]]
+        idle = values[3] + (values[4] if len(values)>4 else 0)
+        times.append((sum(values) - idle, sum(values)))
+    return times
+
+
+def cpu_utilization(before, after):
+    if before is None or after is None:
+        return None
+    return [
+        round(100 * (busy1 - busy0) / (total1 - total0), 1) if total1>total0 else 0.0
+        for (busy0, total0), (busy1, total1) in zip(before, after)
+    ]
+
+
+def peak_rss():
+    """Peak RSS in MiB of this process and of its largest child. Both only
+    grow over the life of the process, see `isolated_run`."""
+    if resource is None:
+        return None
+    scale = 1 / 2**20 if sys.platform=="darwin" else 1 / 2**10
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1),
+    }
+
+
+def summarize(latencies):
+    if not latencies:
+        return None
+    if len(latencies)==1:
+        p50 = p95 = p99 = latencies[0]
+    else:
+        q = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = q[49], q[94], q[98]
+    return {
+        "p50": round(p50, 4),
+        "p95": round(p95, 4),
+        "p99": round(p99, 4),
+        "mean": round(statistics.fmean(latencies), 4),
+        "max": round(max(latencies), 4),
+    }
+
+
+def histogram_quantile(q, buckets, counts):
+    """Quantile estimated from per-bucket counts, interpolating linearly
+    inside the bucket like Prometheus' histogram_quantile."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative, lower = 0, 0.0
+    for upper, count in zip([*buckets, float("inf")], counts):
+        if cumulative + count>=rank:
+            if upper==float("inf"):
+                return lower
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = upper
+    return lower
+
+
+# Targets: each returns the latencies of the documents and the number of failures
+
+_client = {}
+
+
+def _init_client():
+    logger.remove()
+    _client["parser"] = build_parser()
+
+
+def _timed_parse(filepath):
+    start = time.perf_counter()
+    try:
+        _client["parser"].parse(filepath, return_output=True)
+    except BaseException:
+        return time.perf_counter() - start, False
+    return time.perf_counter() - start, True
+
+
+def run_parse(filepaths, clients, args):
+    with ProcessPoolExecutor(clients, initializer=_init_client) as pool:
+        # Warm up every client before starting the clock
+        list(pool.map(time.sleep, [0.1] * clients))
+        start = time.perf_counter()
+        outcomes = list(pool.map(_timed_parse, filepaths))
+        elapsed = time.perf_counter() - start
+    return elapsed, [latency for latency, _ in outcomes], sum(1 for _, ok in outcomes if not ok), "exact"
+
+
+def run_batch(filepaths, clients, args):
+    with tempfile.TemporaryDirectory() as directory:
+        METRICS.multiprocess_dir = directory
+        os.environ["FORM16_METRICS_DIR"] = directory
+        try:
+            start = time.perf_counter()
+            failed = sum(1 for r in parse_many(filepaths, max_workers=clients) if r.error is not None)
+            elapsed = time.perf_counter() - start
+            snapshot = METRICS.collect()[STAGE_DURATION.name]
+        finally:
+            METRICS.multiprocess_dir = None
+            del os.environ["FORM16_METRICS_DIR"]
+
+    counts = next((value[:-2] for labels, value in snapshot["samples"] if labels==["parse"]), [])
+    latencies = {
+        name: histogram_quantile(q, snapshot["buckets"], counts)
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+    }
+    return elapsed, latencies, failed, "histogram"
+
+
+def _post(url, filepath, timeout):
+    with open(filepath, "rb") as fp:
+        body = fp.read()
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/pdf"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = 200<=response.status<300
+    except OSError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_http(filepaths, clients, args):
+    with ThreadPoolExecutor(clients) as pool:
+        start = time.perf_counter()
+        outcomes = list(pool.map(lambda filepath: _post(args.url, filepath, args.timeout), filepaths))
+        elapsed = time.perf_counter() - start
+    return elapsed, [latency for latency, _ in outcomes], sum(1 for _, ok in outcomes if not ok), "exact"
+
+
+RUNNERS = {"parse": run_parse, "batch": run_batch, "http": run_http}
+
+
+def run(filepaths, target, clients, args):
+    cpu_before = cpu_times()
+    elapsed, latencies, failed, source = RUNNERS[target](filepaths, clients, args)
+    cpu_after = cpu_times()
+    return {
+        "clients": clients,
+        "documents": len(filepaths),
+        "failed": failed,
+        "elapsed": round(elapsed, 3),
+        "docs_per_sec": round(len(filepaths) / elapsed, 2),
+        "latency": summarize(latencies) if isinstance(latencies, list) else latencies,
+        "latency_source": source,
+        "cpu_utilization": cpu_utilization(cpu_before, cpu_after),
+        "peak_rss_mib": peak_rss(),
+    }
+
+
+def _run_quietly(filepaths, target, clients, args):
+    logger.remove()
+    return run(filepaths, target, clients, args)
+
+
+def isolated_run(filepaths, target, clients, args):
+    """`run` in a new process, so its peak RSS covers this client count only."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        return pool.submit(_run_quietly, filepaths, target, clients, args).result()
+
+
+def version():
+    try:
+        return metadata.version("form16-parser")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--target", choices=TARGETS, default="parse")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=1, help="Replay every document this many times")
+    parser.add_argument("--url", help="Endpoint of the http target, receives each PDF as the POST body")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Request timeout of the http target")
+    parser.add_argument("--label", help="Free-form label saved with the results, e.g. a version or branch")
+    parser.add_argument("--output", type=Path, help="Save the results as JSON")
+    args = parser.parse_args()
+    if args.target=="http" and not args.url:
+        parser.error("--url is required with --target http")
+
+    logger.remove()
+    filepaths = sorted(str(p) for p in args.directory.glob("*.pdf")) * args.repeat
+    if not filepaths:
+        raise SystemExit(f"No PDF files in {args.directory}")
+
+    results = {
+        "label": args.label,
+        "version": version(),
+        "target": args.target,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "runs": [],
+    }
+    print(f"{len(filepaths)} documents, target {args.target}")
+    print(f"{'clients':>8}{'docs/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'failed':>8}{'cpu %':>8}")
+    for clients in sorted(set(args.clients)):
+        r = isolated_run(filepaths, args.target, clients, args)
+        results["runs"].append(r)
+        latency = r["latency"] or {}
+        cpu = r["cpu_utilization"]
+        print(
+            f"{clients:>8}{r['docs_per_sec']:>10.1f}"
+            + "".join(f"{latency.get(p) or 0:>9.3f}" for p in ("p50", "p95", "p99"))
+            + f"{r['failed']:>8}{statistics.fmean(cpu) if cpu else 0:>8.0f}"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compare the throughput of `parse_many` executors and worker counts.
+
+Usage:
+    python benchmarks/parse_many.py /path/to/pdfs [--workers 1 2 4 8] [--repeat 1]
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+from loguru import logger
+from form16_parser import parse_many
+
+
+def run(filepaths, executor, workers):
+    start = time.perf_counter()
+    failed = sum(1 for r in parse_many(filepaths, executor=executor, max_workers=workers) if r.error is not None)
+    elapsed = time.perf_counter() - start
+    return elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=1, help="Parse every document this many times")
+    args = parser.parse_args()
+
+    logger.remove()
+    filepaths = sorted(str(p) for p in args.directory.glob("*.pdf")) * args.repeat
+    if not filepaths:
+        raise SystemExit(f"No PDF files in {args.directory}")
+
+    baseline, failed = run(filepaths, "serial", 1)
+    print(f"{len(filepaths)} documents ({failed} failed)")
+    print(f"{'executor':<10}{'workers':>8}{'docs/s':>10}{'speedup':>10}")
+    print(f"{'serial':<10}{1:>8}{len(filepaths) / baseline:>10.1f}{1.0:>10.2f}")
+    for executor in ("thread", "process"):
+        for workers in sorted(set(args.workers)):
+            elapsed, _ = run(filepaths, executor, workers)
+            print(f"{executor:<10}{workers:>8}{len(filepaths) / elapsed:>10.1f}{baseline / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,38 @@
-from form16_parser.parser import build_parser, Parser
-from form16_parser._exceptions import UnsupportedForm16Error
+from form16_parser.parser import PARSER_VERSION, build_parser, Parser
+from form16_parser.pdf import extract_tables
+from form16_parser.layout import LayoutStore
+from form16_parser.backends import BackendSelector, CachedBackend, PyMuPDFBackend, TextLayerBackend
+from form16_parser.capture import SlowDocumentCapture
+from form16_parser.reconcile import reconcile
+from form16_parser.metrics import METRICS
+from form16_parser.batch import BatchResult, parse_many
+from form16_parser.archive import ResultArchive
+from form16_parser.ingest import Manifest, ingest
+from form16_parser.jobs import JobQueue, run_worker, run_workers
+from form16_parser._exceptions import BudgetExceededError, NotForm16Error, UnsupportedForm16Error
 
 __all__ = [
+    "PARSER_VERSION",
     "build_parser",
     "Parser",
+    "extract_tables",
+    "parse_many",
+    "BatchResult",
+    "LayoutStore",
+    "SlowDocumentCapture",
+    "BackendSelector",
+    "CachedBackend",
+    "PyMuPDFBackend",
+    "TextLayerBackend",
+    "reconcile",
+    "METRICS",
+    "ResultArchive",
+    "ingest",
+    "Manifest",
+    "JobQueue",
+    "run_worker",
+    "run_workers",
+    "BudgetExceededError",
+    "NotForm16Error",
     "UnsupportedForm16Error",
 ]
\ No newline at end of file
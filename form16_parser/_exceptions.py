@@ -1,2 +1,29 @@
 class UnsupportedForm16Error(BaseException):
-    pass
\ No newline at end of file
+    pass
+
+
+class NotForm16Error(Exception):
+    pass
+
+
+class BudgetExceededError(Exception):
+    """A document used more time, pages or tables than it was allowed.
+    `diagnostics` describes how far parsing got."""
+
+    def __init__(self, budget: str, limit, diagnostics: dict | None = None):
+        super().__init__(budget, limit, diagnostics or {})
+
+    @property
+    def budget(self):
+        return self.args[0]
+
+    @property
+    def limit(self):
+        return self.args[1]
+
+    @property
+    def diagnostics(self):
+        return self.args[2]
+
+    def __str__(self):
+        return f"Document exceeded its {self.budget} budget of {self.limit}: {self.diagnostics}"
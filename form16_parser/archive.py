@@ -0,0 +1,309 @@
+import json
+import os
+import sqlite3
+import struct
+import zlib
+from pathlib import Path
+
+from form16_parser.batch import BatchResult
+
+
+MAGIC = b"F16A"
+FORMAT_VERSION = 1
+
+# Frame: type, payload length, payload crc32
+FRAME_HEADER = struct.Struct(">cII")
+KEYS_FRAME = b"K"
+BLOCK_FRAME = b"B"
+# Block payload prefix: size of the key dictionary the block was encoded with
+BLOCK_HEADER = struct.Struct(">I")
+
+INDEX_FIELDS = {
+    "certificate_num": "certificate_num",
+    "pan": "pan_of_the_employee_or_specified_senior_citizen",
+    "tan": "tan_of_the_deductor",
+    "assessment_year": "assesment_year",
+}
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    block INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    path TEXT,
+    certificate_num TEXT,
+    pan TEXT,
+    tan TEXT,
+    assessment_year TEXT
+);
+CREATE INDEX IF NOT EXISTS records_certificate_num ON records (certificate_num);
+CREATE INDEX IF NOT EXISTS records_pan ON records (pan);
+CREATE INDEX IF NOT EXISTS records_tan ON records (tan);
+CREATE INDEX IF NOT EXISTS records_assessment_year ON records (assessment_year);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def index_values(result: dict):
+    header = result.get("part_a") or result.get("part_b") or {}
+    return {column: header.get(field) for column, field in INDEX_FIELDS.items()}
+
+
+class ResultArchive:
+    """Append-only, compressed store of parse results.
+
+    Dict keys are replaced by ids from a key dictionary kept in the archive
+    itself, and results are written in zlib-compressed blocks of
+    `block_size`. A sqlite index next to the archive (`<archive>.idx`) maps
+    certificate number, employee PAN, TAN and assessment year to a block, so
+    fetching one certificate decompresses a single block. The index can be
+    rebuilt from the archive with `reindex`.
+
+    One writer at a time. Readers see every block flushed before they query.
+    """
+
+    def __init__(
+        self,
+        filepath: str | Path,
+        block_size: int = 256,
+        level: int = 6,
+        readonly: bool = False,
+    ) -> None:
+        self._filepath = Path(filepath)
+        self.block_size = block_size
+        self.level = level
+        self.readonly = readonly
+        self._keys = []
+        self._key_ids = {}
+        self._pending = []
+        self._cached_block = (None, None)
+
+        if readonly:
+            self._fp = open(self._filepath, "rb")
+        else:
+            new = not self._filepath.exists()
+            self._fp = open(self._filepath, "a+b")
+            if new:
+                self._fp.write(MAGIC + bytes([FORMAT_VERSION]))
+                self._fp.flush()
+        self._check_header()
+
+        index_path = self._filepath.with_name(self._filepath.name + ".idx")
+        rebuild = not index_path.exists()
+        self._index = sqlite3.connect(str(index_path), isolation_level=None)
+        self._index.executescript(INDEX_SCHEMA)
+        if rebuild:
+            self.reindex()
+
+        end = self._committed_end()
+        self._read_keys(end)
+        if not readonly and os.path.getsize(self._filepath)>end:
+            # Frames after the last indexed block come from an interrupted write
+            self._fp.truncate(end)
+
+    def _check_header(self):
+        self._fp.seek(0)
+        header = self._fp.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)]!=MAGIC:
+            raise ValueError(f"{self._filepath} is not a result archive")
+        if header[len(MAGIC)]!=FORMAT_VERSION:
+            raise ValueError(f"Unsupported archive format version {header[len(MAGIC)]} in {self._filepath}")
+
+    def close(self):
+        if not self.readonly:
+            self.flush()
+        self._fp.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._index.execute("SELECT COUNT(*) FROM records").fetchone()[0] + len(self._pending)
+
+    def _committed_end(self):
+        row = self._index.execute("SELECT value FROM meta WHERE key = 'end'").fetchone()
+        return row[0] if row is not None else len(MAGIC) + 1
+
+    # Frames
+
+    def _frames(self, start: int, end: int, types=(KEYS_FRAME, BLOCK_FRAME)):
+        """Yield `(offset, type, payload)` of the frames between `start` and
+        `end`. Payloads of other types are skipped without reading them."""
+        offset = start
+        while offset<end:
+            self._fp.seek(offset)
+            frame_type, length, crc = FRAME_HEADER.unpack(self._fp.read(FRAME_HEADER.size))
+            payload = None
+            if frame_type in types:
+                payload = self._fp.read(length)
+                if zlib.crc32(payload)!=crc:
+                    raise ValueError(f"Corrupt frame at offset {offset} in {self._filepath}")
+                yield offset, frame_type, payload
+            offset += FRAME_HEADER.size + length
+
+    def _write_frame(self, frame_type: bytes, payload: bytes) -> int:
+        self._fp.seek(0, os.SEEK_END)
+        offset = self._fp.tell()
+        self._fp.write(FRAME_HEADER.pack(frame_type, len(payload), zlib.crc32(payload)))
+        self._fp.write(payload)
+        return offset
+
+    def _read_keys(self, end: int):
+        self._keys = []
+        for _, _, payload in self._frames(len(MAGIC) + 1, end, types=(KEYS_FRAME,)):
+            self._keys.extend(json.loads(payload))
+        self._key_ids = {key: i for i, key in enumerate(self._keys)}
+
+    # Encoding
+
+    def _encode(self, value, new_keys):
+        if isinstance(value, dict):
+            encoded = {}
+            for key, item in value.items():
+                key_id = self._key_ids.get(key)
+                if key_id is None:
+                    key_id = self._key_ids[key] = len(self._keys)
+                    self._keys.append(key)
+                    new_keys.append(key)
+                encoded[key_id] = self._encode(item, new_keys)
+            return encoded
+        if isinstance(value, (list, tuple)):
+            return [self._encode(item, new_keys) for item in value]
+        return value
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            keys = self._keys
+            return {keys[int(key_id)]: self._decode(item) for key_id, item in value.items()}
+        if isinstance(value, list):
+            return [self._decode(item) for item in value]
+        return value
+
+    # Writing
+
+    def append(self, result: dict, path: str | Path | None = None):
+        if self.readonly:
+            raise ValueError("Archive is opened read-only")
+        self._pending.append((str(path) if path is not None else None, result))
+        if len(self._pending)>=self.block_size:
+            self.flush()
+
+    def extend(self, results) -> int:
+        """Append results, or the `BatchResult`s of `parse_many` (failed
+        documents are skipped). Returns the number of results appended."""
+        appended = 0
+        for result in results:
+            if isinstance(result, BatchResult):
+                if result.error is not None:
+                    continue
+                self.append(result.result, path=result.path)
+            else:
+                self.append(result)
+            appended += 1
+        return appended
+
+    def flush(self):
+        if not self._pending:
+            return
+        new_keys = []
+        records = [[path, self._encode(result, new_keys)] for path, result in self._pending]
+        payload = BLOCK_HEADER.pack(len(self._keys)) + zlib.compress(
+            json.dumps(records, separators=(",", ":")).encode(), self.level)
+        if new_keys:
+            self._write_frame(KEYS_FRAME, json.dumps(new_keys).encode())
+        block = self._write_frame(BLOCK_FRAME, payload)
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+
+        self._index.execute("BEGIN")
+        self._index.executemany(
+            "INSERT INTO records (block, position, path, certificate_num, pan, tan, assessment_year) "
+            "VALUES (:block, :position, :path, :certificate_num, :pan, :tan, :assessment_year)",
+            (
+                {"block": block, "position": position, "path": path, **index_values(result)}
+                for position, (path, result) in enumerate(self._pending)
+            ),
+        )
+        self._index.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('end', ?)", (self._fp.tell(),))
+        self._index.execute("COMMIT")
+        self._pending = []
+
+    def reindex(self):
+        """Rebuild the index by scanning the archive."""
+        self._index.execute("BEGIN")
+        self._index.execute("DELETE FROM records")
+        self._index.execute("DELETE FROM meta")
+        self._keys = []
+        end = os.path.getsize(self._filepath)
+        try:
+            for offset, frame_type, payload in self._frames(len(MAGIC) + 1, end):
+                if frame_type==KEYS_FRAME:
+                    self._keys.extend(json.loads(payload))
+                    continue
+                for position, (path, result) in enumerate(self._decode_block(payload)):
+                    self._index.execute(
+                        "INSERT INTO records (block, position, path, certificate_num, pan, tan, assessment_year) "
+                        "VALUES (:block, :position, :path, :certificate_num, :pan, :tan, :assessment_year)",
+                        {"block": offset, "position": position, "path": path, **index_values(result)},
+                    )
+                end_of_block = offset + FRAME_HEADER.size + len(payload)
+                self._index.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('end', ?)", (end_of_block,))
+        except (struct.error, ValueError):
+            # A torn frame at the tail, keep everything before it
+            pass
+        self._index.execute("COMMIT")
+        self._read_keys(self._committed_end())
+
+    # Reading
+
+    def _decode_block(self, payload: bytes):
+        (num_keys,) = BLOCK_HEADER.unpack_from(payload)
+        if num_keys>len(self._keys):
+            # Appended by another writer since the dictionary was read
+            self._read_keys(self._committed_end())
+        if num_keys>len(self._keys):
+            raise ValueError(f"Block needs {num_keys} keys, the archive dictionary has {len(self._keys)}")
+        records = json.loads(zlib.decompress(payload[BLOCK_HEADER.size:]))
+        return [(path, self._decode(result)) for path, result in records]
+
+    def _block(self, offset: int):
+        if self._cached_block[0]!=offset:
+            _, _, payload = next(self._frames(offset, offset + 1))
+            self._cached_block = (offset, self._decode_block(payload))
+        return self._cached_block[1]
+
+    def find(self, certificate_num=None, pan=None, tan=None, assessment_year=None):
+        """Yield `(path, result)` of the results matching every given field,
+        in the order they were appended."""
+        self.flush()
+        filters = {"certificate_num": certificate_num, "pan": pan, "tan": tan, "assessment_year": assessment_year}
+        filters = {column: value for column, value in filters.items() if value is not None}
+        where = " AND ".join(f"{column} = :{column}" for column in filters) or "1"
+        rows = self._index.execute(
+            f"SELECT block, position FROM records WHERE {where} ORDER BY id", filters,
+        ).fetchall()
+        for block, position in rows:
+            yield self._block(block)[position]
+
+    def get(self, certificate_num: str) -> dict:
+        """The latest result appended for `certificate_num`."""
+        self.flush()
+        row = self._index.execute(
+            "SELECT block, position FROM records WHERE certificate_num = ? ORDER BY id DESC LIMIT 1",
+            (certificate_num,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(certificate_num)
+        return self._block(row[0])[row[1]][1]
+
+    def scan(self):
+        """Stream `(path, result)` of every result, one block in memory at a time."""
+        self.flush()
+        for _, _, payload in self._frames(len(MAGIC) + 1, self._committed_end(), types=(BLOCK_FRAME,)):
+            yield from self._decode_block(payload)
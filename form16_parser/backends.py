@@ -0,0 +1,335 @@
+import abc
+import json
+import os
+import re
+import threading
+import weakref
+from pathlib import Path
+
+from loguru import logger
+from form16_parser.layout import CLIP_EDGE_TOLERANCE
+from form16_parser.table import Table
+import fitz
+
+
+class Backend(abc.ABC):
+    """Extracts the tables of a page. Every backend returns `Table`s shaped
+    like PyMuPDF's `to_pandas()` output (an index column, the header row
+    first), so `Parser.parse_a` and `Parser.parse_b` do not depend on the
+    engine. Backends are called with `MUPDF_LOCK` held."""
+
+    name = ""
+
+    @abc.abstractmethod
+    def page_tables(self, pdf, page, page_number: int) -> list[Table]:
+        ...
+
+
+def _table_rows(cells):
+    """Rows in the layout of `to_pandas().reset_index().T.reset_index().T`."""
+    names = list(cells[0])
+    for i, name in enumerate(names):
+        if not name:
+            names[i] = f"Col{i}"
+    if len(names)!=len(set(names)):
+        names = [name if name==f"Col{i}" else f"{i}-{name}" for i, name in enumerate(names)]
+    return [["index", *names], *[[i, *row] for i, row in enumerate(cells[1:])]]
+
+
+class PyMuPDFBackend(Backend):
+    """`page.find_tables()`, searching only the area of the layout profile
+    of the document when there is one."""
+
+    name = "pymupdf"
+
+    def page_tables(self, pdf, page, page_number: int) -> list[Table]:
+        pymu_tables = self._find_tables(pdf, page)
+        tables = []
+        for pymu_table in pymu_tables:
+            df = pymu_table.to_pandas().reset_index().T.reset_index().T
+            tables.append(Table(df=df, page_number=page_number, bbox=tuple(pymu_table.bbox)))
+        return tables
+
+    def _find_tables(self, pdf, page):
+        clip = pdf.layout.clip(page.number) if pdf.layout is not None else None
+        if clip is not None:
+            # Tables keep their top and sides between documents of a layout but
+            # grow downwards with the number of rows (e.g. Part A challans)
+            clip = fitz.Rect(clip[0], clip[1], clip[2], page.rect.y1)
+            pymu_tables = page.find_tables(clip=clip, strategy=pdf.layout.strategy).tables
+            if len(pymu_tables)==pdf.layout.num_tables(page.number) and not self._truncated(pymu_tables, clip):
+                return pymu_tables
+            logger.debug(f"Layout profile does not match page {page.number}, searching the full page.")
+            pdf.layout_fallback = True
+        return page.find_tables().tables
+
+    @staticmethod
+    def _truncated(pymu_tables, clip):
+        # A table cut by the clip ends on its edge instead of inside the padding
+        for table in pymu_tables:
+            x0, y0, x1, _ = table.bbox
+            if x0<=clip.x0 + CLIP_EDGE_TOLERANCE or y0<=clip.y0 + CLIP_EDGE_TOLERANCE or x1>=clip.x1 - CLIP_EDGE_TOLERANCE:
+                return True
+        return False
+
+
+class TextLayerBackend(Backend):
+    """Rebuilds ruled tables from the drawn lines and the words of the text
+    layer, without PyMuPDF's table finder.
+
+    Much cheaper than `find_tables()` but only suited to documents whose
+    every cell is ruled, like the Form 16 generated by TRACES.
+    """
+
+    name = "text"
+
+    # Lines closer than this (in points) are the same grid line
+    TOLERANCE = 3.0
+
+    def page_tables(self, pdf, page, page_number: int) -> list[Table]:
+        horizontal, vertical = self._segments(page)
+        words = page.get_text("words")
+        tables = []
+        for h_lines, v_lines in self._grids(horizontal, vertical):
+            table = self._table(h_lines, v_lines, words, page_number)
+            if table is not None:
+                tables.append(table)
+        tables.sort(key=lambda table: (table.bbox[1], table.bbox[0]))
+        return tables
+
+    def _segments(self, page):
+        # (x0, x1, y) and (y0, y1, x)
+        horizontal, vertical = [], []
+        tol = self.TOLERANCE
+        for path in page.get_drawings():
+            for item in path["items"]:
+                if item[0]=="l":
+                    p1, p2 = item[1], item[2]
+                    if abs(p1.y - p2.y)<=tol:
+                        horizontal.append((min(p1.x, p2.x), max(p1.x, p2.x), (p1.y + p2.y) / 2))
+                    elif abs(p1.x - p2.x)<=tol:
+                        vertical.append((min(p1.y, p2.y), max(p1.y, p2.y), (p1.x + p2.x) / 2))
+                elif item[0]=="re":
+                    r = item[1]
+                    if r.height<=tol:
+                        horizontal.append((r.x0, r.x1, (r.y0 + r.y1) / 2))
+                    elif r.width<=tol:
+                        vertical.append((r.y0, r.y1, (r.x0 + r.x1) / 2))
+                    else:
+                        horizontal.extend(((r.x0, r.x1, r.y0), (r.x0, r.x1, r.y1)))
+                        vertical.extend(((r.y0, r.y1, r.x0), (r.y0, r.y1, r.x1)))
+        return horizontal, vertical
+
+    def _grids(self, horizontal, vertical):
+        """Group the segments into tables: segments that cross are in the same table."""
+        tol = self.TOLERANCE
+        parent = list(range(len(horizontal) + len(vertical)))
+
+        def find(i):
+            while parent[i]!=i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        offset = len(horizontal)
+        for i, (x0, x1, y) in enumerate(horizontal):
+            for j, (y0, y1, x) in enumerate(vertical):
+                if x0 - tol<=x<=x1 + tol and y0 - tol<=y<=y1 + tol:
+                    parent[find(i)] = find(offset + j)
+
+        groups = {}
+        for i, segment in enumerate(horizontal):
+            groups.setdefault(find(i), ([], []))[0].append(segment)
+        for j, segment in enumerate(vertical):
+            groups.setdefault(find(offset + j), ([], []))[1].append(segment)
+        return [group for group in groups.values() if group[0] and group[1]]
+
+    def _snap(self, values):
+        snapped = []
+        for value in sorted(values):
+            if snapped and value - snapped[-1]<=self.TOLERANCE:
+                continue
+            snapped.append(value)
+        return snapped
+
+    def _table(self, h_lines, v_lines, words, page_number):
+        tol = self.TOLERANCE
+        ys = self._snap(y for _, _, y in h_lines)
+        xs = self._snap(x for _, _, x in v_lines)
+        if len(ys)<2 or len(xs)<2:
+            return None
+
+        def has_vertical(x, y0, y1):
+            mid = (y0 + y1) / 2
+            return any(abs(vx - x)<=tol and vy0 - tol<=mid<=vy1 + tol for vy0, vy1, vx in v_lines)
+
+        def has_horizontal(y, x0, x1):
+            mid = (x0 + x1) / 2
+            return any(abs(hy - y)<=tol and hx0 - tol<=mid<=hx1 + tol for hx0, hx1, hy in h_lines)
+
+        n_rows, n_cols = len(ys) - 1, len(xs) - 1
+        # Cells merged into the cell above or to the left are None, like PyMuPDF
+        cells = [[None] * n_cols for _ in range(n_rows)]
+        rects = []
+        covered = set()
+        for r in range(n_rows):
+            for c in range(n_cols):
+                if (r, c) in covered:
+                    continue
+                c_end = c + 1
+                while c_end<n_cols and not has_vertical(xs[c_end], ys[r], ys[r + 1]):
+                    c_end += 1
+                r_end = r + 1
+                while r_end<n_rows and not has_horizontal(ys[r_end], xs[c], xs[c_end]):
+                    r_end += 1
+                covered.update((rr, cc) for rr in range(r, r_end) for cc in range(c, c_end))
+                rects.append((r, c, (xs[c], ys[r], xs[c_end], ys[r_end])))
+
+        # Words by cell, then by line, in reading order
+        lines = {}
+        for x0, y0, x1, y1, text, block, line, _ in words:
+            cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+            if not (xs[0]<cx<xs[-1] and ys[0]<cy<ys[-1]):
+                continue
+            for r, c, (rx0, ry0, rx1, ry1) in rects:
+                if rx0<cx<rx1 and ry0<cy<ry1:
+                    lines.setdefault((r, c), {}).setdefault((block, line), []).append((y0, x0, text))
+                    break
+        for r, c, _ in rects:
+            cell_lines = sorted(lines.get((r, c), {}).values(), key=lambda ws: min(w[0] for w in ws))
+            cells[r][c] = "\n".join(" ".join(w[2] for w in sorted(ws, key=lambda w: w[1])) for ws in cell_lines)
+
+        return Table(rows=_table_rows(cells), page_number=page_number, bbox=(xs[0], ys[0], xs[-1], ys[-1]))
+
+
+class CachedBackend(Backend):
+    """Replays the tables of documents parsed before, keyed by the content
+    hash of the document. Pages that are not cached are extracted with
+    `backend`. Only tables of successfully parsed documents are stored,
+    see `Parser.parse`.
+
+    Entries are never evicted while parsing: call `prune` (e.g. after each
+    batch) to bound the size of the directory."""
+
+    name = "cached"
+
+    def __init__(self, directory: str | Path, backend: Backend | None = None) -> None:
+        self.directory = Path(directory)
+        self.backend = backend if backend is not None else PyMuPDFBackend()
+        self._lock = threading.Lock()
+        # Entry of each open document, read once
+        self._entries = weakref.WeakKeyDictionary()
+
+    def _path(self, pdf):
+        return self.directory / f"{pdf.content_hash}.json"
+
+    def _load(self, pdf):
+        try:
+            with open(self._path(pdf), "r") as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable table cache {self._path(pdf)}: {e}")
+            return None
+
+    def has(self, pdf) -> bool:
+        return self._path(pdf).exists()
+
+    def page_tables(self, pdf, page, page_number: int) -> list[Table]:
+        cached = self._entries.get(pdf)
+        if cached is None:
+            cached = self._entries[pdf] = self._load(pdf) or {"pages": {}}
+        if str(page_number) in cached["pages"]:
+            return [Table.from_dict(data) for data in cached["pages"][str(page_number)]]
+        return self.backend.page_tables(pdf, page, page_number)
+
+    def store(self, pdf):
+        """Add the pages extracted from `pdf` to its cache entry."""
+        # Pages replayed from the entry read for this document need no write
+        known = self._entries.get(pdf, {"pages": {}})["pages"]
+        if all(str(page_number) in known for page_number in pdf.extracted_page_tables):
+            return
+        with self._lock:
+            cached = self._load(pdf) or {"pages": {}}
+            new_pages = {
+                str(page_number): [table.to_dict() for table in tables]
+                for page_number, tables in pdf.extracted_page_tables.items()
+                if str(page_number) not in cached["pages"]
+            }
+            if not new_pages:
+                return
+            cached["pages"].update(new_pages)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._path(pdf)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w") as fp:
+                json.dump(cached, fp)
+            os.replace(tmp, path)
+            if pdf in self._entries:
+                self._entries[pdf] = cached
+
+    def discard(self, pdf):
+        with self._lock:
+            self._entries.pop(pdf, None)
+            self._path(pdf).unlink(missing_ok=True)
+
+    def prune(self, max_bytes: int) -> int:
+        """Delete the least recently stored entries until the cache holds at
+        most `max_bytes`. Returns the number of entries deleted."""
+        with self._lock:
+            try:
+                entries = sorted(
+                    (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                    for entry in os.scandir(self.directory) if entry.name.endswith(".json")
+                )
+            except FileNotFoundError:
+                return 0
+            size = sum(entry_size for _, entry_size, _ in entries)
+            deleted = 0
+            for _, entry_size, path in entries:
+                if size<=max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+                deleted += 1
+        return deleted
+
+
+class BackendSelector:
+    """Chooses the backend of each document from cheap signals.
+
+    - documents in `cache` are replayed from it;
+    - documents whose producer matches one of `text_producers` and that
+      have at most `max_text_pages` pages use the text-layer backend;
+    - everything else uses `default`, PyMuPDF's table finder.
+
+    A document that fails to parse with another backend than `default` is
+    parsed again with `default`.
+    """
+
+    def __init__(
+        self,
+        default: Backend | None = None,
+        cache: CachedBackend | str | Path | None = None,
+        text_producers=(),
+        max_text_pages: int | None = 10,
+    ) -> None:
+        self.default = default if default is not None else PyMuPDFBackend()
+        if isinstance(cache, (str, Path)):
+            cache = CachedBackend(cache, backend=self.default)
+        self.cache = cache
+        self.text = TextLayerBackend()
+        self.text_producers = [re.compile(pattern) for pattern in text_producers]
+        self.max_text_pages = max_text_pages
+
+    def select(self, pdf) -> Backend:
+        if self.cache is not None and self.cache.has(pdf):
+            return self.cache
+        if any(pattern.search(pdf.producer) for pattern in self.text_producers):
+            if self.max_text_pages is None or pdf.page_count<=self.max_text_pages:
+                return self.text
+        return self.default
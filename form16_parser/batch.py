@@ -0,0 +1,199 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from form16_parser.interning import InternPool
+from form16_parser.layout import LayoutStore
+from form16_parser.parser import build_parser
+from form16_parser._exceptions import BudgetExceededError, UnsupportedForm16Error
+
+
+EXECUTORS = ("process", "thread", "serial")
+
+# Times a document may be in flight in a pool that broke for an unknown
+# reason (e.g. a crash in PyMuPDF) before it is failed
+MAX_POOL_BREAKS = 3
+
+
+class BatchResult(NamedTuple):
+    path: str
+    result: dict | None
+    error: BaseException | None
+
+
+# Every worker (process or thread) gets its own parser
+_worker = threading.local()
+
+
+def _init_worker(layout_store, fields, budget=None, stalled=None, kill_after=None):
+    _worker.parser = build_parser(layout_store=layout_store)
+    _worker.fields = fields
+    _worker.budget = budget or {}
+    _worker.running = None
+    if kill_after is not None:
+        _worker.running = running = {}
+        threading.Thread(target=_watchdog, args=(running, stalled, kill_after), daemon=True).start()
+
+
+def _watchdog(running, stalled, kill_after):
+    # Budgets are only checked between pages, a page stuck in PyMuPDF is
+    # ended by exiting the whole worker process
+    while True:
+        time.sleep(min(1.0, kill_after / 10))
+        current = running.get("document")
+        if current is not None and time.monotonic() - current[1]>kill_after:
+            stalled.put((current[0], time.monotonic() - current[1]))
+            os._exit(1)
+
+
+def _parse(parser, filepath, fields, budget) -> BatchResult:
+    try:
+        result = parser.parse(filepath, return_output=True, fields=fields, **budget)
+    except (Exception, UnsupportedForm16Error) as e:
+        return BatchResult(str(filepath), None, e)
+    return BatchResult(str(filepath), result, None)
+
+
+def _parse_one(filepath) -> BatchResult:
+    if _worker.running is not None:
+        _worker.running["document"] = (filepath, time.monotonic())
+    try:
+        return _parse(_worker.parser, filepath, _worker.fields, _worker.budget)
+    finally:
+        if _worker.running is not None:
+            _worker.running["document"] = None
+
+
+def _serial_results(filepaths, layout_store, fields, budget):
+    # A parser of its own: batches consumed side by side must not share one
+    parser = build_parser(layout_store=layout_store)
+    for filepath in filepaths:
+        yield _parse(parser, filepath, fields, budget)
+
+
+def parse_many(
+    filepaths: Iterable[str | Path],
+    executor: str = "process",
+    max_workers: int | None = None,
+    fields: list[str] | None = None,
+    layout_store: LayoutStore | str | Path | None = None,
+    chunksize: int = 4,
+    intern_strings: bool = False,
+    timeout: float | None = None,
+    max_pages: int | None = None,
+    max_tables: int | None = None,
+    kill_grace: float = 10.0,
+) -> Iterator[BatchResult]:
+    """Parse many documents concurrently, yielding results in input order.
+
+    - `"process"`: a process pool. Scales with cores and is the default.
+    - `"thread"`: a thread pool, for environments where forking is expensive
+      or not allowed. Each thread opens its own documents and has its own
+      parser; a layout store is shared between threads. PyMuPDF is not
+      thread-safe, so table extraction is serialized and only the rest of
+      the parsing overlaps.
+    - `"serial"`: parse in the calling thread.
+
+    Failures do not stop the batch, they are returned in `BatchResult.error`.
+    With `intern_strings`, the results share their repeated strings and
+    legend/verification structures (see `InternPool`), which lowers memory
+    when a batch is kept in memory.
+
+    `timeout`, `max_pages` and `max_tables` are the per-document budgets of
+    `Parser.parse`. With the process executor and a `timeout`, a worker
+    still busy with one document `kill_grace` seconds after its timeout
+    (e.g. stuck on a single page) is killed, and the document fails with
+    `BudgetExceededError`. The other documents are unaffected.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor: {executor!r}. Expected one of {EXECUTORS}.")
+    filepaths = [str(filepath) for filepath in filepaths]
+    budget = {
+        name: value
+        for name, value in (("timeout", timeout), ("max_pages", max_pages), ("max_tables", max_tables))
+        if value is not None
+    }
+
+    if executor == "serial":
+        results = _serial_results(filepaths, layout_store, fields, budget)
+        return _interned(results) if intern_strings else results
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if executor == "thread":
+        if isinstance(layout_store, (str, Path)):
+            # One store per process, shared by its threads
+            layout_store = LayoutStore(layout_store)
+        pool = ThreadPoolExecutor(max_workers, initializer=_init_worker, initargs=(layout_store, fields, budget))
+        results = _results(pool, filepaths, {})
+    else:
+        if isinstance(layout_store, LayoutStore):
+            raise ValueError("Pass the layout store path to the process executor, each process opens its own store.")
+        if timeout is not None:
+            initargs = (layout_store, fields, budget)
+            results = _killable_results(filepaths, max_workers, initargs, timeout, timeout + kill_grace)
+        else:
+            pool = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(layout_store, fields, budget))
+            results = _results(pool, filepaths, {"chunksize": chunksize})
+
+    return _interned(results) if intern_strings else results
+
+
+def _results(pool, filepaths, map_kwargs):
+    with pool:
+        yield from pool.map(_parse_one, filepaths, **map_kwargs)
+
+
+def _killable_results(filepaths, max_workers, initargs, timeout, kill_after):
+    # A killed worker breaks the whole pool: the documents it took down with
+    # it are resubmitted to a new pool, the stalled one is failed.
+    stalled = multiprocessing.SimpleQueue()
+    results = {}
+    breaks = [0] * len(filepaths)
+    todo = list(range(len(filepaths)))
+    next_index = 0
+    while todo:
+        pool = ProcessPoolExecutor(
+            max_workers, initializer=_init_worker, initargs=(*initargs, stalled, kill_after))
+        with pool:
+            futures = [(i, pool.submit(_parse_one, filepaths[i])) for i in todo]
+            todo = []
+            for i, future in futures:
+                try:
+                    results[i] = future.result()
+                except BrokenProcessPool:
+                    todo.append(i)
+                while next_index in results:
+                    yield results.pop(next_index)
+                    next_index += 1
+
+        killed = {}
+        while not stalled.empty():
+            path, elapsed = stalled.get()
+            killed[path] = elapsed
+        for i in list(todo):
+            path = filepaths[i]
+            if not killed:
+                breaks[i] += 1
+            if path in killed:
+                error = BudgetExceededError("timeout", timeout, {"elapsed": round(killed[path], 3), "killed": True})
+            elif breaks[i]>=MAX_POOL_BREAKS:
+                error = BrokenProcessPool(f"Worker processes died {breaks[i]} times while parsing {path}")
+            else:
+                continue
+            results[i] = BatchResult(path, None, error)
+            todo.remove(i)
+        while next_index in results:
+            yield results.pop(next_index)
+            next_index += 1
+
+
+def _interned(results):
+    # Interned in the calling process, results from workers arrive as copies
+    pool = InternPool()
+    for r in results:
+        yield r if r.result is None else r._replace(result=pool.intern(r.result))
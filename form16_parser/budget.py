@@ -0,0 +1,59 @@
+import time
+
+from form16_parser._exceptions import BudgetExceededError
+
+
+class Budget:
+    """Limits on the work spent on one document.
+
+    Checked between pages, so a single page that stalls inside PyMuPDF is
+    only noticed once it returns. `parse_many` hard-kills process workers
+    for that case.
+    """
+
+    def __init__(
+        self,
+        timeout: float | None = None,
+        max_pages: int | None = None,
+        max_tables: int | None = None,
+    ) -> None:
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.max_tables = max_tables
+        self.started = time.monotonic()
+        self.pages = 0
+        self.tables = 0
+
+    def retry(self):
+        """Budget of another attempt at the same document: pages and tables
+        are counted again, the time keeps running."""
+        budget = Budget(timeout=self.timeout, max_pages=self.max_pages, max_tables=self.max_tables)
+        budget.started = self.started
+        return budget
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def diagnostics(self):
+        return {
+            "elapsed": round(self.elapsed, 3),
+            "pages_extracted": self.pages,
+            "tables_extracted": self.tables,
+        }
+
+    def check(self):
+        if self.timeout is not None and self.elapsed>self.timeout:
+            raise BudgetExceededError("timeout", self.timeout, self.diagnostics())
+        if self.max_tables is not None and self.tables>self.max_tables:
+            raise BudgetExceededError("max_tables", self.max_tables, self.diagnostics())
+
+    def before_page(self):
+        self.check()
+        if self.max_pages is not None and self.pages>=self.max_pages:
+            raise BudgetExceededError("max_pages", self.max_pages, self.diagnostics())
+
+    def after_page(self, num_tables: int):
+        self.pages += 1
+        self.tables += num_tables
+        self.check()
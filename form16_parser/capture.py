@@ -0,0 +1,207 @@
+import cProfile
+import json
+import multiprocessing.util
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from loguru import logger
+from form16_parser.metrics import recorded_stages, unrecorded
+from form16_parser.pdf import content_hash
+from form16_parser._exceptions import UnsupportedForm16Error
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or `None`."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform=="darwin" else peak * 1024
+
+
+class Watch:
+    """What `Parser.parse` learned about the document being watched."""
+
+    def __init__(self) -> None:
+        self.pdf = None
+
+
+class SlowDocumentCapture:
+    """Saves profiling artifacts of documents that are slow to parse.
+
+    Watched calls run without a profiler. When a call takes longer than
+    `latency_threshold` seconds, or raises the process' peak RSS by more
+    than `memory_threshold` bytes, a directory named after the document's
+    content hash is written with:
+
+    - `profile.pstats`, with `profile`: a cProfile dump of the document
+      parsed once more, with the same backend and layout profile, by a
+      background thread. The watched call does not wait for it, but the
+      profiled run competes with the next documents for CPU. `wait` blocks
+      until the queued profiles are written; they are also written before
+      the process exits;
+    - `report.json`: duration, memory, per-stage timings, page and table
+      counts, the type of every extracted table and the error, if any;
+    - the document itself, if `copy_document` is set.
+
+    Captures stop once `max_captures` directories or `max_bytes` exist.
+    Profiles are skipped while another profiler is active in the process.
+    The metrics of the profiled runs are not recorded.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        latency_threshold: float = 5.0,
+        memory_threshold: int | None = None,
+        max_captures: int = 100,
+        max_bytes: int = 512 * 1024 * 1024,
+        copy_document: bool = False,
+        profile: bool = False,
+    ) -> None:
+        self.directory = Path(directory)
+        self.latency_threshold = latency_threshold
+        self.memory_threshold = memory_threshold
+        self.max_captures = max_captures
+        self.max_bytes = max_bytes
+        self.copy_document = copy_document
+        self.profile = profile
+        self._lock = threading.Lock()
+        # Profiles to write, and the process the thread writing them runs in
+        self._profiles = None
+        self._profiles_pid = None
+
+    @contextmanager
+    def watch(self, filepath: str | Path, classify=None, replay=None):
+        """`replay(pdf)` parses the document again, as the watched call
+        did with `pdf`, to profile it."""
+        watch = Watch()
+        rss = peak_rss()
+        start = time.perf_counter()
+        error = None
+        with recorded_stages() as stages:
+            try:
+                yield watch
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                memory = peak_rss() - rss if rss is not None else None
+                if self._is_slow(duration, memory):
+                    try:
+                        self._save(filepath, watch, replay, stages, duration, memory, error, classify)
+                    except Exception as e:
+                        logger.warning(f"Could not capture slow document {filepath}: {e!r}")
+
+    def _is_slow(self, duration, memory):
+        if self.latency_threshold is not None and duration>=self.latency_threshold:
+            return True
+        return self.memory_threshold is not None and memory is not None and memory>=self.memory_threshold
+
+    def _usage(self):
+        captures = [path for path in self.directory.iterdir() if path.is_dir()]
+        size = sum(f.stat().st_size for path in captures for f in path.iterdir())
+        return len(captures), size
+
+    def wait(self):
+        """Block until the profiles queued by this process are written."""
+        with self._lock:
+            profiles = self._profiles if self._profiles_pid==os.getpid() else None
+        if profiles is not None:
+            profiles.join()
+
+    def _queue_profile(self, replay, pdf, filepath):
+        with self._lock:
+            # Threads do not survive a fork, each process starts its own
+            if self._profiles_pid!=os.getpid():
+                self._profiles = queue.Queue()
+                self._profiles_pid = os.getpid()
+                threading.Thread(target=self._write_profiles, args=(self._profiles,), daemon=True).start()
+                multiprocessing.util.Finalize(self, self.wait, exitpriority=0)
+            self._profiles.put((replay, pdf, filepath))
+
+    @staticmethod
+    def _write_profiles(profiles):
+        while True:
+            replay, pdf, filepath = profiles.get()
+            try:
+                SlowDocumentCapture._profile(replay, pdf, filepath)
+            except Exception as e:
+                logger.warning(f"Could not profile {filepath}: {e!r}")
+            finally:
+                profiles.task_done()
+
+    @staticmethod
+    def _profile(replay, pdf, filepath):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            logger.debug(f"Another profiler is active, not writing {filepath}")
+            return
+        try:
+            with unrecorded():
+                replay(pdf)
+        except (Exception, UnsupportedForm16Error):
+            pass  # Failures of the watched call are in the report
+        finally:
+            profiler.disable()
+        profiler.dump_stats(str(filepath))
+
+    def _save(self, filepath, watch, replay, stages, duration, memory, error, classify):
+        target = self.directory / (watch.pdf.content_hash if watch.pdf is not None else content_hash(filepath))
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if target.exists():
+                return
+            count, size = self._usage()
+            if count>=self.max_captures or size>=self.max_bytes:
+                logger.debug(f"Capture limit reached, not capturing {filepath}")
+                return
+            target.mkdir()
+
+        report = {
+            "path": str(filepath),
+            "duration": duration,
+            "peak_rss_increase": memory,
+            "stages": [{"stage": stage, "duration": seconds} for stage, seconds in stages],
+            "error": repr(error) if error is not None else None,
+        }
+        pdf = watch.pdf
+        if pdf is not None:
+            page_tables = pdf.extracted_page_tables
+            report["page_count"] = pdf.page_count
+            report["producer"] = pdf.producer
+            report["backend"] = pdf.backend.name
+            report["layout_fallback"] = pdf.layout_fallback
+            report["table_count"] = sum(len(tables) for tables in page_tables.values())
+            report["tables"] = [
+                {
+                    "page": page_number,
+                    "index": index,
+                    "type": classify(table) if classify is not None else None,
+                    "shape": [len(table.rows), len(table.rows[0]) if table.rows else 0],
+                    "bbox": table.bbox,
+                }
+                for page_number, tables in sorted(page_tables.items())
+                for index, table in enumerate(tables)
+            ]
+
+        with open(target / "report.json", "w") as fp:
+            json.dump(report, fp, indent=2, default=str)
+        if self.copy_document:
+            shutil.copyfile(filepath, target / Path(filepath).name)
+        if self.profile and replay is not None and pdf is not None:
+            self._queue_profile(replay, pdf, target / "profile.pstats")
+        logger.info(f"Captured slow document {filepath} ({duration:.2f}s) to {target}")
@@ -0,0 +1,252 @@
+import fnmatch
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from loguru import logger
+from form16_parser.batch import parse_many
+from form16_parser.parser import PARSER_VERSION
+from form16_parser.pdf import content_hash
+
+
+PARSED = "parsed"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    parser_version TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result_location TEXT,
+    error TEXT,
+    parsed_at REAL NOT NULL
+);
+"""
+
+# Manifest rows written per transaction while a run is parsing
+COMMIT_EVERY = 100
+
+# Above this share of known files missing from a scan, the directory is
+# more likely unmounted than emptied, and the manifest is not pruned
+MAX_PRUNE_FRACTION = 0.5
+
+
+def scan(directory: str | Path, pattern: str = "*.pdf", skipped: list | None = None):
+    """Yield `(path, size, mtime_ns)` of the files under `directory` whose
+    name matches `pattern` (case-insensitively). Subdirectories that cannot
+    be read are logged and appended to `skipped`."""
+    root = str(directory)
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            entries = os.scandir(path)
+        except OSError as e:
+            if path==root:
+                raise
+            logger.warning(f"Skipping unreadable directory {path}: {e}")
+            if skipped is not None:
+                skipped.append(path)
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif fnmatch.fnmatch(entry.name.lower(), pattern.lower()):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+
+
+class Manifest:
+    """What was ingested from a directory: size, mtime and content hash of
+    every file, the parser version that parsed it and where its result is.
+    Stored in a sqlite database."""
+
+    def __init__(self, filepath: str | Path) -> None:
+        self._filepath = Path(filepath)
+        self._conn = sqlite3.connect(str(self._filepath), isolation_level=None)
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def entries(self):
+        """path -> (size, mtime_ns, hash, parser_version, status)"""
+        return {
+            path: tuple(values)
+            for path, *values in self._conn.execute(
+                "SELECT path, size, mtime_ns, hash, parser_version, status FROM files")
+        }
+
+    def _executemany(self, sql, rows):
+        # One transaction, autocommit would commit every row on its own
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(sql, rows)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def record(self, rows):
+        """Insert or replace rows of (path, size, mtime_ns, hash,
+        parser_version, status, result_location, error)."""
+        now = time.time()
+        self._executemany(
+            "INSERT OR REPLACE INTO files "
+            "(path, size, mtime_ns, hash, parser_version, status, result_location, error, parsed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((*row, now) for row in rows),
+        )
+
+    def touch(self, rows):
+        """Update the size and mtime of files whose content did not change."""
+        self._executemany("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?", rows)
+
+    def remove(self, paths):
+        self._executemany("DELETE FROM files WHERE path = ?", ((path,) for path in paths))
+
+    def get(self, filepath: str | Path):
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, hash, parser_version, status, result_location, error, parsed_at "
+            "FROM files WHERE path = ?", (str(filepath),),
+        ).fetchone()
+        if row is None:
+            raise KeyError(str(filepath))
+        keys = ("size", "mtime_ns", "hash", "parser_version", "status", "result_location", "error", "parsed_at")
+        return dict(zip(keys, row))
+
+
+def _write_result(output_dir: Path, digest: str, result) -> str:
+    filepath = output_dir / f"{digest}.json"
+    tmp = filepath.with_name(f"{filepath.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as fp:
+        json.dump(result, fp)
+    os.replace(tmp, filepath)
+    return str(filepath)
+
+
+def ingest(
+    directory: str | Path,
+    manifest: Manifest | str | Path,
+    output_dir: str | Path,
+    pattern: str = "*.pdf",
+    parser_version: str = PARSER_VERSION,
+    retry_failed: bool = False,
+    prune: bool | None = None,
+    **parse_many_kwargs,
+) -> dict:
+    """Parse the documents of `directory` that are new or changed since the
+    last run, and write each result to `output_dir/<content hash>.json`.
+
+    Files are compared with the manifest by size and mtime, and only files
+    that differ are hashed: a file whose content did not change is not
+    parsed again. Every file is parsed again when `parser_version` differs
+    from the one recorded. Files that failed are retried with
+    `retry_failed`.
+
+    Files that disappeared are dropped from the manifest, except under
+    subdirectories that could not be read. By default nothing is dropped
+    when the scan finds no file or more than `MAX_PRUNE_FRACTION` of the
+    known files are missing, e.g. because a share is not mounted: pass
+    `prune=True` to drop them anyway, or `prune=False` to never drop.
+    Extra keyword arguments go to `parse_many`.
+
+    Returns counts of what the run did.
+    """
+    start = time.perf_counter()
+    if isinstance(manifest, (str, Path)):
+        with Manifest(manifest) as manifest:
+            return ingest(
+                directory, manifest, output_dir, pattern=pattern, parser_version=parser_version,
+                retry_failed=retry_failed, prune=prune, **parse_many_kwargs,
+            )
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    known = manifest.entries()
+    seen = set()
+    todo = {}  # path -> (size, mtime_ns, hash)
+    touched = []
+    skipped = []
+    stats = {"scanned": 0, "new": 0, "modified": 0, "outdated": 0, "retried": 0, "unchanged": 0}
+    for path, size, mtime_ns in scan(directory, pattern, skipped):
+        stats["scanned"] += 1
+        seen.add(path)
+        entry = known.get(path)
+        if entry is None:
+            stats["new"] += 1
+            todo[path] = (size, mtime_ns, None)
+            continue
+        old_size, old_mtime_ns, old_hash, old_version, status = entry
+        changed = (size, mtime_ns)!=(old_size, old_mtime_ns)
+        if not changed and old_version==parser_version and (status==PARSED or not retry_failed):
+            stats["unchanged"] += 1
+            continue
+        digest = content_hash(path) if changed else old_hash
+        if digest!=old_hash:
+            stats["modified"] += 1
+        elif old_version!=parser_version:
+            stats["outdated"] += 1
+        elif status!=PARSED and retry_failed:
+            stats["retried"] += 1
+        else:
+            # Same content under a new mtime
+            stats["unchanged"] += 1
+            touched.append((size, mtime_ns, path))
+            continue
+        todo[path] = (size, mtime_ns, digest)
+
+    manifest.touch(touched)
+    skipped = tuple(os.path.join(path, "") for path in skipped)
+    missing = [path for path in known if path not in seen and not path.startswith(skipped)]
+    if prune is None:
+        prune = stats["scanned"]>0 and len(missing)<=MAX_PRUNE_FRACTION * len(known)
+        if missing and not prune:
+            logger.warning(
+                f"{len(missing)} of {len(known)} known files are missing from {directory}, "
+                "not dropping them from the manifest. Pass prune=True to drop them.")
+    deleted = missing if prune else []
+    manifest.remove(deleted)
+
+    parsed = failed = 0
+    rows = []
+    for r in parse_many(list(todo), **parse_many_kwargs):
+        size, mtime_ns, digest = todo[r.path]
+        digest = digest or content_hash(r.path)
+        if r.error is None:
+            parsed += 1
+            location = _write_result(output_dir, digest, r.result)
+            rows.append((r.path, size, mtime_ns, digest, parser_version, PARSED, location, None))
+        else:
+            failed += 1
+            logger.warning(f"Failed to parse {r.path}: {r.error!r}")
+            error = "".join(traceback.format_exception(type(r.error), r.error, r.error.__traceback__)).strip()
+            rows.append((r.path, size, mtime_ns, digest, parser_version, FAILED, None, error))
+        if len(rows)>=COMMIT_EVERY:
+            manifest.record(rows)
+            rows = []
+    manifest.record(rows)
+
+    return {
+        **stats,
+        "missing": len(missing),
+        "deleted": len(deleted),
+        "skipped_directories": len(skipped),
+        "parsed": parsed,
+        "failed": failed,
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
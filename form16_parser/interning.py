@@ -0,0 +1,55 @@
+# Structures that repeat between the results of one deductor, shared whole
+SHARED_KEYS = ("legend_used_in_form_16", "verification")
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return ("__list__", tuple(_freeze(v) for v in value))
+    return value
+
+
+class InternPool:
+    """Deduplicates the strings of parse results held together in memory.
+
+    Equal strings (employer names, addresses, amounts, legend text) become
+    one object, and equal legend and verification structures are shared by
+    every result that has them. The JSON output is unchanged, but results
+    passed through a pool share objects and must be treated as read-only.
+    """
+
+    def __init__(self) -> None:
+        self._strings = {}
+        self._shared = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def string(self, value: str) -> str:
+        return self._strings.setdefault(value, value)
+
+    def intern(self, value):
+        if isinstance(value, str):
+            return self.string(value)
+        if isinstance(value, dict):
+            interned = {}
+            for key, item in value.items():
+                if key in SHARED_KEYS:
+                    interned[self.string(key)] = self._share(item)
+                else:
+                    interned[self.string(key)] = self.intern(item)
+            return interned
+        if isinstance(value, list):
+            return [self.intern(item) for item in value]
+        return value
+
+    def _share(self, value):
+        frozen = _freeze(value)
+        try:
+            shared = self._shared.get(frozen)
+        except TypeError:
+            return self.intern(value)
+        if shared is None:
+            shared = self._shared[frozen] = self.intern(value)
+        return shared
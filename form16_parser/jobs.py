@@ -0,0 +1,276 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from loguru import logger
+from form16_parser.parser import build_parser
+from form16_parser._exceptions import UnsupportedForm16Error
+
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobQueue:
+    """Durable queue of documents to parse, stored in a sqlite database.
+
+    Any number of worker processes, on one or more hosts sharing the
+    database file, lease jobs, parse them and write the result or the error
+    back. A job whose lease expires (e.g. its worker crashed) is handed out
+    again, up to `max_attempts` times. Parse errors are final and are not
+    retried.
+
+    The default rollback journal works on shared filesystems. Use
+    `journal_mode="WAL"` when every worker runs on the same host.
+    """
+
+    def __init__(
+        self,
+        filepath: str | Path,
+        lease_timeout: float = 300.0,
+        max_attempts: int = 3,
+        journal_mode: str = "DELETE",
+    ) -> None:
+        self._filepath = Path(filepath)
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._journal_mode = journal_mode
+        self._conn = sqlite3.connect(str(self._filepath), timeout=60.0, isolation_level=None)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self):
+        # Take the write lock up front so concurrent leases cannot interleave
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def enqueue(self, filepaths) -> int:
+        """Add documents to the queue. Paths already queued are ignored.
+        Returns the number of new jobs."""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (path, enqueued_at) VALUES (?, ?)",
+                ((str(filepath), now) for filepath in filepaths),
+            )
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def lease(self, worker: str, limit: int = 1):
+        """Lease up to `limit` jobs for `worker`. Returns `(job_id, path)` pairs."""
+        now = time.time()
+        conn = self._transaction()
+        try:
+            # Jobs whose workers crashed too often are given up on
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, "Lease expired too many times", now, LEASED, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                "SELECT id, path FROM jobs "
+                "WHERE (status = ? OR (status = ? AND lease_expires < ?)) AND attempts < ? "
+                "ORDER BY id LIMIT ?",
+                (PENDING, LEASED, now, self.max_attempts, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, "
+                "started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                ((LEASED, worker, now + self.lease_timeout, now, job_id) for job_id, _ in rows),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def extend(self, job_id: int, worker: str) -> bool:
+        """Renew the lease of a job that is still being worked on."""
+        cursor = self._conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + self.lease_timeout, job_id, worker, LEASED),
+        )
+        return cursor.rowcount==1
+
+    @contextmanager
+    def heartbeat(self, job_id: int, worker: str, interval: float | None = None):
+        """Keep renewing the lease of a job, every `interval` seconds (a third
+        of the lease timeout by default), while the block runs."""
+        interval = interval if interval is not None else self.lease_timeout / 3
+        stop = threading.Event()
+
+        def beat():
+            # sqlite connections belong to the thread that opened them
+            with JobQueue(self._filepath, lease_timeout=self.lease_timeout, journal_mode=self._journal_mode) as queue:
+                while not stop.wait(interval):
+                    if not queue.extend(job_id, worker):
+                        logger.warning(f"Lease on job {job_id} was lost by {worker}.")
+                        return
+
+        thread = threading.Thread(target=beat, name=f"lease-{job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _finish(self, job_id, worker, status, result, error) -> bool:
+        # A worker whose lease was taken over must not overwrite the new owner
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires = NULL "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (status, result, error, time.time(), job_id, worker, LEASED),
+        )
+        if cursor.rowcount!=1:
+            logger.warning(f"Lease on job {job_id} was lost by {worker}, dropping its outcome.")
+            return False
+        return True
+
+    def complete(self, job_id: int, worker: str, result) -> bool:
+        return self._finish(job_id, worker, DONE, json.dumps(result), None)
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        return self._finish(job_id, worker, FAILED, None, error)
+
+    def retry_failed(self) -> int:
+        """Put every failed job back in the queue."""
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = ?, attempts = 0, error = NULL, worker = NULL WHERE status = ?",
+            (PENDING, FAILED),
+        )
+        return cursor.rowcount
+
+    def result(self, filepath: str | Path):
+        row = self._conn.execute(
+            "SELECT status, result, error FROM jobs WHERE path = ?", (str(filepath),),
+        ).fetchone()
+        if row is None:
+            raise KeyError(str(filepath))
+        status, result, error = row
+        return {
+            "status": status,
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+        }
+
+    def results(self, status: str = DONE):
+        """Iterate over `(path, result or error)` of the jobs in `status`."""
+        column = "error" if status==FAILED else "result"
+        for path, value in self._conn.execute(
+            f"SELECT path, {column} FROM jobs WHERE status = ? ORDER BY id", (status,),
+        ):
+            yield path, (json.loads(value) if column=="result" and value is not None else value)
+
+    def progress(self, window: float = 60.0):
+        """Job counts per status and the throughput over the last `window`
+        seconds, in documents per second."""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for status, count in self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        finished = self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE finished_at >= ?", (time.time() - window,),
+        ).fetchone()[0]
+        throughput = finished / window
+        remaining = counts[PENDING] + counts[LEASED]
+        return {
+            **counts,
+            "total": sum(counts.values()),
+            "throughput": throughput,
+            "eta_seconds": remaining / throughput if throughput else None,
+        }
+
+
+def run_worker(
+    filepath: str | Path,
+    parser=None,
+    worker: str | None = None,
+    batch_size: int = 1,
+    poll_interval: float = 1.0,
+    stop_when_empty: bool = True,
+    **queue_kwargs,
+) -> int:
+    """Lease and parse jobs until the queue is empty. Returns the number of
+    jobs this worker finished. The lease of the job being parsed is renewed
+    in the background, so parses may take longer than the lease timeout."""
+    parser = parser if parser is not None else build_parser()
+    worker = worker or default_worker_id()
+    finished = 0
+    with JobQueue(filepath, **queue_kwargs) as queue:
+        while True:
+            jobs = queue.lease(worker, limit=batch_size)
+            if not jobs:
+                if stop_when_empty:
+                    break
+                time.sleep(poll_interval)
+                continue
+            for job_id, path in jobs:
+                # Jobs later in the batch may have waited a while
+                if not queue.extend(job_id, worker):
+                    continue
+                try:
+                    with queue.heartbeat(job_id, worker):
+                        result = parser.parse(path, return_output=True)
+                except (Exception, UnsupportedForm16Error) as e:
+                    logger.warning(f"Failed to parse {path}: {e!r}")
+                    error = "".join(traceback.format_exception(type(e), e, e.__traceback__)).strip()
+                    queue.fail(job_id, worker, error)
+                else:
+                    queue.complete(job_id, worker, result)
+                finished += 1
+    return finished
+
+
+def run_workers(filepath: str | Path, processes: int | None = None, **worker_kwargs) -> int:
+    """Run `processes` workers on this host until the queue is empty."""
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(run_worker, filepath, **worker_kwargs) for _ in range(processes)]
+        return sum(future.result() for future in futures)
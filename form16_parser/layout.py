@@ -0,0 +1,146 @@
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+
+# Padding (in points) added around the learned table area so that small
+# shifts between documents from the same layout still fall inside the clip.
+CLIP_PADDING = 4.0
+# A table closer than this to the edge of the clip was probably cut by it
+CLIP_EDGE_TOLERANCE = 1.0
+
+DEFAULT_STRATEGY = "lines"
+
+TAN_PATTERN = re.compile(r"\b[A-Z]{4}[0-9]{5}[A-Z]\b")
+ASSESSMENT_YEAR_PATTERN = re.compile(r"\b(20[0-9]{2}-[0-9]{2})\b")
+
+
+def layout_key(pdf):
+    """Key identifying a layout: (TAN, PDF producer, assessment year).
+
+    Read from the text layer of the first page so the key is known before
+    any table detection runs. Returns `None` if the TAN or the assessment
+    year cannot be found.
+    """
+    text = pdf.page_text(0)
+    tan = TAN_PATTERN.search(text)
+    year = ASSESSMENT_YEAR_PATTERN.search(text)
+    if tan is None or year is None:
+        return None
+    return "|".join((tan.group(0), pdf.producer, year.group(1)))
+
+
+class LayoutProfile:
+    def __init__(self, pages: dict | None = None, strategy: str = DEFAULT_STRATEGY) -> None:
+        # page number -> {"clip": [x0, y0, x1, y1], "num_tables": int}
+        self.pages = pages or {}
+        self.strategy = strategy
+
+    def clip(self, page_number: int):
+        page = self.pages.get(page_number)
+        if page is None:
+            return None
+        return page["clip"]
+
+    def num_tables(self, page_number: int):
+        return self.pages[page_number]["num_tables"]
+
+    @classmethod
+    def learn(cls, page_tables: dict, strategy: str = DEFAULT_STRATEGY):
+        """Build a profile from the tables extracted per page."""
+        pages = {}
+        for page_number, tables in page_tables.items():
+            bboxes = [table.bbox for table in tables if table.bbox is not None]
+            if not bboxes or len(bboxes)!=len(tables):
+                continue
+            pages[page_number] = {
+                "clip": [
+                    min(b[0] for b in bboxes) - CLIP_PADDING,
+                    min(b[1] for b in bboxes) - CLIP_PADDING,
+                    max(b[2] for b in bboxes) + CLIP_PADDING,
+                    max(b[3] for b in bboxes) + CLIP_PADDING,
+                ],
+                "num_tables": len(tables),
+            }
+        return cls(pages=pages, strategy=strategy)
+
+    def merge(self, other):
+        pages = dict(self.pages)
+        pages.update(other.pages)
+        return LayoutProfile(pages=pages, strategy=self.strategy)
+
+    def to_dict(self):
+        return {
+            "strategy": self.strategy,
+            "pages": {str(k): v for k, v in self.pages.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            pages={int(k): v for k, v in data["pages"].items()},
+            strategy=data.get("strategy", DEFAULT_STRATEGY),
+        )
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    key TEXT PRIMARY KEY,
+    profile TEXT NOT NULL
+);
+"""
+
+
+class LayoutStore:
+    """Layout profiles persisted in a sqlite database, keyed by `layout_key`.
+    A store can be shared by the threads of a process, and the processes
+    of a pool each open their own store on the same file."""
+
+    def __init__(self, filepath: str | Path) -> None:
+        self._filepath = Path(filepath)
+        self._filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self._filepath), timeout=60.0, isolation_level=None, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, key):
+        row = self._conn.execute("SELECT profile FROM profiles WHERE key = ?", (key,)).fetchone()
+        return LayoutProfile.from_dict(json.loads(row[0])) if row is not None else None
+
+    def _put(self, key, profile):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO profiles (key, profile) VALUES (?, ?)", (key, json.dumps(profile.to_dict())))
+
+    def get(self, key: str):
+        with self._lock:
+            return self._get(key)
+
+    def put(self, key: str, profile: LayoutProfile):
+        with self._lock:
+            self._put(key, profile)
+
+    def merge(self, key: str, profile: LayoutProfile):
+        """Add the pages of `profile` to the stored profile of `key`. The
+        stored profile is read in the same transaction, so the pages other
+        processes learned or discarded meanwhile are kept."""
+        with self._lock:
+            # Take the write lock up front so concurrent merges cannot interleave
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = self._get(key)
+                self._put(key, profile if current is None else current.merge(profile))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def discard(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM profiles WHERE key = ?", (key,))
@@ -0,0 +1,332 @@
+import atexit
+import json
+import multiprocessing.util
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+from form16_parser._exceptions import UnsupportedForm16Error
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PAGE_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+TABLE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 100)
+
+
+# Threads inside `unrecorded()`
+_muted = threading.local()
+
+
+@contextmanager
+def unrecorded():
+    """Do not record the metrics and stages of this thread, e.g. while a
+    document is parsed a second time to profile it."""
+    previous = getattr(_muted, "active", False)
+    _muted.active = True
+    try:
+        yield
+    finally:
+        _muted.active = previous
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = [*zip(labelnames, labelvalues), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, registry, name: str, documentation: str, labelnames=()) -> None:
+        self._registry = registry
+        self._lock = registry._lock
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels)!=set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(k), v if not isinstance(v, list) else list(v)] for k, v in self._values.items()]
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": samples,
+        }
+
+    def reset(self):
+        self._values = {}
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, value: float = 1, **labels):
+        if getattr(_muted, "active", False):
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+        self._registry._maybe_flush()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name: str, documentation: str, labelnames=(), buckets=DURATION_BUCKETS) -> None:
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if getattr(_muted, "active", False):
+            return
+        key = self._key(labels)
+        # Per bucket counts (not cumulative), then +Inf, sum and count
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 3)
+            values[idx] += 1
+            values[-2] += value
+            values[-1] += 1
+        self._registry._maybe_flush()
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+
+class MetricsRegistry:
+    """Process-wide counters and histograms, exportable as Prometheus text.
+
+    Updates take one uncontended lock and touch a dict. To aggregate over
+    several processes (e.g. pool workers), point every process to the same
+    directory with `multiprocess_dir` or the `FORM16_METRICS_DIR` environment
+    variable: each process then writes its own snapshot there and `render`
+    merges all of them.
+
+    Snapshots are never deleted, so the totals of exited workers stay
+    counted. Empty the directory when the service starts, or earlier runs
+    are counted too.
+    """
+
+    def __init__(self, multiprocess_dir: str | Path | None = None, flush_interval: float = 5.0) -> None:
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        # Tells apart processes that get the same pid
+        self._run_id = uuid.uuid4().hex[:8]
+        self.multiprocess_dir = multiprocess_dir
+        atexit.register(self.flush)
+        if hasattr(os, "register_at_fork"):
+            # Forked workers must not report the parent's values a second time
+            os.register_at_fork(after_in_child=self._reset)
+        # Forked multiprocessing workers exit without running atexit handlers
+        multiprocessing.util.register_after_fork(self, MetricsRegistry._flush_at_exit)
+
+    @property
+    def multiprocess_dir(self):
+        return self._multiprocess_dir
+
+    @multiprocess_dir.setter
+    def multiprocess_dir(self, path):
+        self._multiprocess_dir = Path(path) if path is not None else None
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._lock = self._lock
+            metric.reset()
+        self._last_flush = time.monotonic()
+        self._run_id = uuid.uuid4().hex[:8]
+
+    def _flush_at_exit(self):
+        multiprocessing.util.Finalize(self, self.flush, exitpriority=0)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def _maybe_flush(self):
+        if self._multiprocess_dir is not None and time.monotonic() - self._last_flush>=self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write this process' snapshot to the multiprocess directory."""
+        if self._multiprocess_dir is None:
+            return
+        self._last_flush = time.monotonic()
+        self._multiprocess_dir.mkdir(parents=True, exist_ok=True)
+        filepath = self._multiprocess_dir / f"metrics_{os.getpid()}_{self._run_id}.json"
+        tmp = filepath.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp, "w") as fp:
+            json.dump(self.snapshot(), fp)
+        os.replace(tmp, filepath)
+
+    def collect(self):
+        """Snapshot merged over every process sharing the multiprocess directory."""
+        if self._multiprocess_dir is None:
+            return self.snapshot()
+        self.flush()
+        snapshots = []
+        for filepath in sorted(self._multiprocess_dir.glob("metrics_*.json")):
+            try:
+                with open(filepath, "r") as fp:
+                    snapshots.append(json.load(fp))
+            except (OSError, ValueError):
+                continue
+        return merge_snapshots(snapshots)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        return render_snapshot(self.collect())
+
+
+def merge_snapshots(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labelvalues, value in metric["samples"]:
+                key = tuple(labelvalues)
+                if isinstance(value, list):
+                    current = target["samples"].get(key)
+                    target["samples"][key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target["samples"][key] = target["samples"].get(key, 0) + value
+    for metric in merged.values():
+        metric["samples"] = [[list(k), v] for k, v in metric["samples"].items()]
+    return merged
+
+
+def render_snapshot(snapshot) -> str:
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for labelvalues, value in sorted(metric["samples"]):
+            if metric["type"] == "histogram":
+                cumulative = 0
+                for bound, count in zip([*metric["buckets"], float("inf")], value[:-2]):
+                    cumulative += count
+                    labels = _format_labels(labelnames, labelvalues, (("le", _format_value(bound)),))
+                    lines.append(f"{name}_bucket{labels} {_format_value(cumulative)}")
+                labels = _format_labels(labelnames, labelvalues)
+                lines.append(f"{name}_sum{labels} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{labels} {_format_value(value[-1])}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry(multiprocess_dir=os.environ.get("FORM16_METRICS_DIR"))
+
+DOCUMENTS_PARSED = METRICS.counter(
+    "form16_documents_parsed_total", "Documents parsed successfully.")
+DOCUMENTS_FAILED = METRICS.counter(
+    "form16_documents_failed_total", "Documents that failed to parse, by exception type and stage.",
+    labelnames=("exception", "stage"))
+DOCUMENT_PAGES = METRICS.histogram(
+    "form16_document_pages", "Pages per document.", buckets=PAGE_BUCKETS)
+DOCUMENT_TABLES = METRICS.histogram(
+    "form16_document_tables", "Tables extracted per document.", buckets=TABLE_BUCKETS)
+EXTRACTION_BACKENDS = METRICS.counter(
+    "form16_extraction_backend_total", "Documents extracted, by table extraction backend.",
+    labelnames=("backend",))
+SKIPPED_TABLES = METRICS.counter(
+    "form16_skipped_tables_total", "Part B tables skipped, by table type.",
+    labelnames=("table_type",))
+STAGE_DURATION = METRICS.histogram(
+    "form16_stage_duration_seconds", "Time spent per parsing stage.",
+    labelnames=("stage",))
+
+
+# Per-thread list of (stage, seconds) the stages append to, see `recorded_stages`
+_stage_log = threading.local()
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time a stage and tag exceptions escaping it with the stage name."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if not hasattr(e, "form16_stage"):
+            try:
+                e.form16_stage = stage
+            except AttributeError:
+                pass
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(duration, stage=stage)
+        stages = getattr(_stage_log, "stages", None)
+        if stages is not None and not getattr(_muted, "active", False):
+            stages.append((stage, duration))
+
+
+@contextmanager
+def recorded_stages():
+    """Collect the `(stage, seconds)` of the stages run by this thread."""
+    previous = getattr(_stage_log, "stages", None)
+    _stage_log.stages = stages = []
+    try:
+        yield stages
+    finally:
+        _stage_log.stages = previous
+
+
+def record_failure(e: BaseException, stage: str = "parse"):
+    DOCUMENTS_FAILED.inc(exception=type(e).__name__, stage=getattr(e, "form16_stage", stage))
+
+
+@contextmanager
+def recorded_document():
+    """Count a document as parsed or failed and time the whole parse."""
+    try:
+        with timed_stage("parse"):
+            yield
+    except (Exception, UnsupportedForm16Error) as e:
+        record_failure(e)
+        raise
+    DOCUMENTS_PARSED.inc()
@@ -1,9 +1,30 @@
+import re
+from contextlib import nullcontext
+from itertools import islice
 from pathlib import Path
 from typing import Any
 
 from loguru import logger
 from form16_parser.pdf import PDF
-from form16_parser._exceptions import UnsupportedForm16Error
+from form16_parser.table import Table
+from form16_parser.layout import LayoutProfile, LayoutStore, layout_key
+from form16_parser.backends import BackendSelector
+from form16_parser.budget import Budget
+from form16_parser.capture import SlowDocumentCapture, Watch
+from form16_parser.metrics import (
+    DOCUMENT_PAGES,
+    DOCUMENT_TABLES,
+    EXTRACTION_BACKENDS,
+    SKIPPED_TABLES,
+    recorded_document,
+    timed_stage,
+)
+from form16_parser._exceptions import BudgetExceededError, NotForm16Error, UnsupportedForm16Error
+
+
+# Bump whenever the output of the parser changes. Incremental ingestion
+# re-parses every document recorded with another version.
+PARSER_VERSION = "0.1.0"
 
     
 class Parser:
@@ -90,13 +111,21 @@ class Parser:
     }
 
 
-    def __init__(self) -> None:
-        pass
+    def __init__(
+        self,
+        layout_store: LayoutStore | None = None,
+        capture: SlowDocumentCapture | None = None,
+        backends: BackendSelector | None = None,
+    ) -> None:
+        self.layout_store = layout_store
+        self.backends = backends if backends is not None else BackendSelector()
+        self.capture = capture
 
     @staticmethod
-    def is_form16(pdf: PDF):
+    def is_form16(pdf: PDF | None, tables=None):
         try:
-            first_cell = pdf.tables[0].first_table_cell
+            tables = pdf.tables if tables is None else tables
+            first_cell = tables[0].first_table_cell
             if first_cell=="FORM NO. 16":
                 return True
         except Exception as e:
@@ -106,11 +135,14 @@ class Parser:
         
     @staticmethod
     def parts_info(pdf, return_offset: bool = False):
-        first_columns = pdf.first_table_columns
+        return Parser.parts_info_from_tables(pdf.tables, return_offset=return_offset)
+
+    @staticmethod
+    def parts_info_from_tables(tables, return_offset: bool = False):
         offsets_a = []
         offsets_b = []
-        for tid, first_column in enumerate(first_columns):
-            for rid, cell in enumerate(first_column):
+        for tid, table in enumerate(tables):
+            for rid, cell in enumerate(table.first_table_column):
                 if cell == "PART A":
                     offsets_a.append((tid, rid))
                 elif cell == "PART B":
@@ -146,37 +178,132 @@ class Parser:
         }
 
 
+    # Fields read from the first table of each part. Projections that only
+    # ask for these do not need the rest of the part.
+    HEADER_FIELDS_PARTA = {
+        "certificate_num",
+        "last_updated",
+        "name_and_address_of_the_employer_or_specified_bank",
+        "name_and_address_of_the_employee_or_specified_senior_citizen",
+        "pan_of_the_deductor",
+        "tan_of_the_deductor",
+        "pan_of_the_employee_or_specified_senior_citizen",
+        "employee_ref_num_or_ppo_num_provided_by_employer",
+        "cit_tds",
+        "assesment_year",
+        "period_with_the_employer_from",
+        "period_with_the_employer_to",
+    }
+
+    HEADER_FIELDS_PARTB = HEADER_FIELDS_PARTA - {
+        "employee_ref_num_or_ppo_num_provided_by_employer",
+    }
+
+    PART_HEADINGS = {
+        "part_a": "PART A",
+        "part_b": "PART B",
+    }
+
+    PARTA_SECTION_SUMMARY = "SUMMARY"
+    PARTA_SECTION_SECTION1 = "SECTION1"
+    PARTA_SECTION_SECTION2 = "SECTION2"
+    PARTA_SECTION_VERIFICATION = "VERIFICATION"
+    PARTA_SECTION_LEGEND = "LEGEND"
+
+    # Section headers in the order they appear in Part A. Each header
+    # starts the section it maps to and closes the previous one.
+    PARTA_SECTION_HEADERS = (
+        (
+            "I. DETAILS OF TAX DEDUCTED AND DEPOSITED IN THE CENTRAL GOVERNMENT ACCOUNT THROUGH BOOK ADJUSTMENT\n"
+            "(The deductor to provide payment wise details of tax deducted and deposited with respect to the deductee)",
+            PARTA_SECTION_SECTION1,
+        ),
+        (
+            "II. DETAILS OF TAX DEDUCTED AND DEPOSITED IN THE CENTRAL GOVERNMENT ACCOUNT THROUGH CHALLAN\n"
+            "(The deductor to provide payment wise details of tax deducted and deposited with respect to the deductee)",
+            PARTA_SECTION_SECTION2,
+        ),
+        ("Verification", PARTA_SECTION_VERIFICATION),
+        ("Legend", PARTA_SECTION_LEGEND),
+    )
+
+    _INT_QUERY = re.compile(r"\s*[+-]?\d+(?:_\d+)*\s*")
+
     @staticmethod
     def is_valid_part_a_sec_row(row):
-        def _validate(row):
-            query = row[1]
-            if query in Parser.VALID_ROW_QUERIES_PARTA_SECTION1AND2:
-                return True
-            try:
-                _ = int(query)
-                return True
-            except:
-                return False
-                
-        if _validate(row):
+        query = row[1]
+        if query in Parser.VALID_ROW_QUERIES_PARTA_SECTION1AND2:
             return True
-        return False
+        return isinstance(query, str) and Parser._INT_QUERY.fullmatch(query) is not None
     
+    @staticmethod
     def is_valid_part_a_legend_row(row):
         query = row[1]
         if query in Parser.VALID_ROW_QUERIES_PARTA_LEGEND:
             return True
         return False
 
-    def parse_a(self, tables):
+    @staticmethod
+    def index_part_a_rows(tables):
+        """Stream the Part A rows starting at the quarterly summary and bucket
+        them by section in a single pass.
+
+        Rows are tagged with the section of the most recent header seen and
+        only the valid ones are kept, so no row is copied or revisited. The
+        first row of every section other than the summary is its header.
+        Returns the rows per section and the number of times each header
+        was seen.
+        """
+        # Fix: Honeywell Form 16
+        # The quarterly summary spills over to the second table
+        if len(tables[0].dataframe)<13:
+            tidx, ridx = 1, 1
+        else:
+            tidx, ridx = 0, 13
+
+        headers = dict(Parser.PARTA_SECTION_HEADERS)
+        order = [section for _, section in Parser.PARTA_SECTION_HEADERS]
+        validators = {
+            Parser.PARTA_SECTION_SECTION1: Parser.is_valid_part_a_sec_row,
+            Parser.PARTA_SECTION_SECTION2: Parser.is_valid_part_a_sec_row,
+            Parser.PARTA_SECTION_LEGEND: Parser.is_valid_part_a_legend_row,
+        }
+        sections = {section: [] for section in (Parser.PARTA_SECTION_SUMMARY, *order)}
+        header_counts = {section: 0 for section in order}
+
+        section = Parser.PARTA_SECTION_SUMMARY
+        rows = sections[section]
+        validate = None
+        for table in tables[tidx:]:
+            for row in islice(table.compact_rows, ridx, None):
+                if len(row)>1 and row[1] in headers:
+                    header_section = headers[row[1]]
+                    header_counts[header_section] += 1
+                    # Only move forward, to the first occurrence of a later section
+                    if (
+                        header_counts[header_section]==1
+                        and (section==Parser.PARTA_SECTION_SUMMARY or order.index(header_section)>order.index(section))
+                    ):
+                        section = header_section
+                        rows = sections[section]
+                        validate = validators.get(section)
+                        rows.append(row)
+                        continue
+                if validate is None or validate(row):
+                    rows.append(row)
+            ridx = 0
+
+        return sections, header_counts
+
+    def parse_a(self, tables, header_only: bool = False):
         info = {}
         first_table = tables[0]
 
         # Extract the general details
-        row4 = [c for c in first_table.dataframe.iloc[4].to_list() if c is not None]
-        row6 = [c for c in first_table.dataframe.iloc[6].to_list() if c is not None]
-        row8 = [c for c in first_table.dataframe.iloc[8].to_list() if c is not None]
-        row10 = [c for c in first_table.dataframe.iloc[10].to_list() if c is not None]
+        row4 = first_table.compact_rows[4]
+        row6 = first_table.compact_rows[6]
+        row8 = first_table.compact_rows[8]
+        row10 = first_table.compact_rows[10]
 
         info["certificate_num"] = row4[1].replace("Certificate No. ", "")
         info["last_updated"] = row4[2].replace("Last updated on ", "")
@@ -191,17 +318,35 @@ class Parser:
         info["period_with_the_employer_from"] = row10[3].replace("From\n", "")
         info["period_with_the_employer_to"] = row10[4].replace("To\n", "")
 
-        # Extract: Summary of amount paid/credited and tax deducted at source thereon in respect of the employee
-        row11 = [c for c in first_table.dataframe.iloc[11].to_list() if c is not None]
+        if header_only:
+            return info
+
+        row11 = first_table.compact_rows[11]
         assert "Summary of amount paid/credited and tax deducted at source thereon in respect of the employee" == row11[1]
 
+        sections, header_counts = Parser.index_part_a_rows(tables)
+
+        for section, name in (
+            (Parser.PARTA_SECTION_SECTION1, "Form A Section 1"),
+            (Parser.PARTA_SECTION_SECTION2, "Form A Section 2"),
+            (Parser.PARTA_SECTION_VERIFICATION, "Form A Verification"),
+        ):
+            if header_counts[section]!=1:
+                logger.warning(
+                    f"There must be only one main heading for {name}. "
+                    "Make sure your PDF file is an un-modified Form16. "
+                    "Parsed output might be incorrect.")
+        if header_counts[Parser.PARTA_SECTION_LEGEND]<1:
+            logger.warning(
+                "There must be legend available in the form for Legend. "
+                "Make sure your PDF file is an un-modified Form16. "
+                "Parsed output might be incorrect.")
+
+        # Extract: Summary of amount paid/credited and tax deducted at source thereon in respect of the employee
+        summary_rows = sections[Parser.PARTA_SECTION_SUMMARY]
         info["summary_of_amount_paid_or_credited_and_tax_deducted"] = {}
-        qidx = 13
-        # Fix: Honeywell Form 16
-        if len(tables[0].dataframe)<13:
-            first_table = tables[1]
-            qidx = 1
-        qrow = [c for c in first_table.dataframe.iloc[qidx].to_list() if c is not None]
+        sidx = 0
+        qrow = summary_rows[sidx]
         qn = int(qrow[1][1:]) if (len(qrow[1])==2 and qrow[1][0]=="Q") else 1
         while qrow[1]==f"Q{qn}":
             info["summary_of_amount_paid_or_credited_and_tax_deducted"][f"q{qn}"] = {
@@ -211,10 +356,10 @@ class Parser:
                 "amt_of_tax_deposited_or_remitted": qrow[5],
             }
             qn+=1
-            qidx+=1
-            qrow = [c for c in first_table.dataframe.iloc[qidx].to_list() if c is not None]
+            sidx+=1
+            qrow = summary_rows[sidx]
 
-        total = [c for c in first_table.dataframe.iloc[qidx].to_list() if c is not None]
+        total = summary_rows[sidx]
         info["summary_of_amount_paid_or_credited_and_tax_deducted"]["total"] = {
             "total_amt_paid_or_credited": total[3],
             "total_amt_of_tax_deducted": total[4],
@@ -222,93 +367,13 @@ class Parser:
         }
 
         # Extract: I. DETAILS OF TAX DEDUCTED AND DEPOSITED IN THE CENTRAL GOVERNMENT ACCOUNT THROUGH BOOK ADJUSTMENT
-        # Note: we cannot use main table / static indices from here
-        qidx+=1
-        hrow = [c for c in first_table.dataframe.iloc[qidx].to_list() if c is not None]
-        forma_sec1_header = (
-            "I. DETAILS OF TAX DEDUCTED AND DEPOSITED IN THE CENTRAL GOVERNMENT ACCOUNT THROUGH BOOK ADJUSTMENT\n"
-            "(The deductor to provide payment wise details of tax deducted and deposited with respect to the deductee)"
-        )
-        assert forma_sec1_header == hrow[1], f"{hrow[1]}"
-
-        # flatten the tables and collect
-        all_rows = []
-        ridx = qidx
-        while ridx<len(first_table.dataframe):
-            row = first_table.dataframe.iloc[ridx]
-            all_rows.append([c for c in row.to_list() if c is not None])
-            ridx+=1
-
-        table_beg = 1
-
-        # Fix: Honeywell Form 16
-        if len(tables[0].dataframe)<13:
-            table_beg = 2
-
-        for table in tables[table_beg:]:
-            ridx = 0
-            while ridx<len(table.dataframe):
-                row = table.dataframe.iloc[ridx]
-                all_rows.append([c for c in row.to_list() if c is not None])
-                ridx+=1
-
-        # Find the table borders
-        forma_sec2_header = (
-            "II. DETAILS OF TAX DEDUCTED AND DEPOSITED IN THE CENTRAL GOVERNMENT ACCOUNT THROUGH CHALLAN\n"
-            "(The deductor to provide payment wise details of tax deducted and deposited with respect to the deductee)"
-        )
-        forma_verification_header = "Verification"
-        forma_legend_header = "Legend"
-        forma_sec1_beg_idxs = []
-        forma_sec2_beg_idxs = []
-        forma_verification_beg_idxs = []
-        forma_legend_beg_idxs = []
-        for i, row in enumerate(all_rows):
-            if row[1] == forma_sec1_header:
-                forma_sec1_beg_idxs.append(i)
-            if row[1] == forma_sec2_header:
-                forma_sec2_beg_idxs.append(i)
-            if row[1] == forma_verification_header:
-                forma_verification_beg_idxs.append(i)
-            if row[1] == forma_legend_header:
-                forma_legend_beg_idxs.append(i)
-
-        if len(forma_sec1_beg_idxs)==1:
-            logger.warning(
-                "There must be only one main heading for Form A Section 1. "
-                "Make sure your PDF file is an un-modified Form16. "
-                "Parsed output might be incorrect.")
-        if len(forma_sec2_beg_idxs)==1:
-            logger.warning(
-                "There must be only one main heading for Form A Section 2. "
-                "Make sure your PDF file is an un-modified Form16. "
-                "Parsed output might be incorrect.")
-        if len(forma_verification_beg_idxs)==1:
-            logger.warning(
-                "There must be only one main heading for Form A Verification. "
-                "Make sure your PDF file is an un-modified Form16. "
-                "Parsed output might be incorrect.")
-        if len(forma_legend_beg_idxs)>=1:
-            logger.warning(
-                "There must be legend available in the form for Legend. "
-                "Make sure your PDF file is an un-modified Form16. "
-                "Parsed output might be incorrect.")
-
-        # parse the tables
-        sec1_rows = all_rows[forma_sec1_beg_idxs[0]:forma_sec2_beg_idxs[0]]
-        sec2_rows = all_rows[forma_sec2_beg_idxs[0]:forma_verification_beg_idxs[0]]
-        verf_rows = all_rows[forma_verification_beg_idxs[0]:forma_legend_beg_idxs[0]]
-        lgnd_rows = all_rows[forma_legend_beg_idxs[0]:]
+        # Note: the section must start right after the summary total
+        assert sidx==len(summary_rows)-1, f"{summary_rows[sidx+1][1]}"
 
-        # remove the redundant headers
-        sec1_rows = [row for row in sec1_rows if row[1] not in ("Sl. No.", "Receipt Numbers of Form\nNo. 24G")]
-        sec2_rows = [row for row in sec2_rows if row[1] not in ("Sl. No.", "BSR Code of the Bank\nBranch")]
-        lgnd_rows = [row for row in lgnd_rows if row[1]!="Legend"]
-
-        # remove invalid rows
-        sec1_rows = [row for row in sec1_rows if Parser.is_valid_part_a_sec_row(row)]
-        sec2_rows = [row for row in sec2_rows if Parser.is_valid_part_a_sec_row(row)]
-        lgnd_rows = [row for row in lgnd_rows if Parser.is_valid_part_a_legend_row(row)]
+        sec1_rows = sections[Parser.PARTA_SECTION_SECTION1]
+        sec2_rows = sections[Parser.PARTA_SECTION_SECTION2]
+        verf_rows = sections[Parser.PARTA_SECTION_VERIFICATION]
+        lgnd_rows = sections[Parser.PARTA_SECTION_LEGEND]
 
         # collect form a section 1 
         info["section_1_tax_deducted_and_deposited_through_book_adjustment"] = []
@@ -351,9 +416,9 @@ class Parser:
             "full_name": verf_rows[4][2].replace("Full Name:", "",)
         }
 
-        # collect legend
+        # collect legend (the first row is the header)
         info["legend_used_in_form_16"] = []
-        for row in lgnd_rows:
+        for row in lgnd_rows[1:]:
             info["legend_used_in_form_16"].append({
                 "legend": row[1],
                 "description": row[2],
@@ -431,13 +496,13 @@ class Parser:
         return False
 
 
-    def parse_b(self, tables):
+    def parse_b(self, tables, header_only: bool = False):
         info = {}
         first_table = tables[0]
 
         # Validate if Part B is official
         try:
-            row3 = [c for c in first_table.dataframe.iloc[3].to_list() if c is not None]
+            row3 = first_table.compact_rows[3]
             if "Certificate No." not in row3[1]:
                 logger.warning("The input form 16 does not contain valid Part B... Skipping Part B.")
                 return {}
@@ -446,10 +511,10 @@ class Parser:
             return {}
 
         # Extract the general details
-        row3 = [c for c in first_table.dataframe.iloc[3].to_list() if c is not None]
-        row5 = [c for c in first_table.dataframe.iloc[5].to_list() if c is not None]
-        row7 = [c for c in first_table.dataframe.iloc[7].to_list() if c is not None]
-        row9 = [c for c in first_table.dataframe.iloc[9].to_list() if c is not None]
+        row3 = first_table.compact_rows[3]
+        row5 = first_table.compact_rows[5]
+        row7 = first_table.compact_rows[7]
+        row9 = first_table.compact_rows[9]
 
         info["certificate_num"] = row3[1].replace("Certificate No. ", "")
         info["last_updated"] = row3[2].replace("Last updated on ", "")
@@ -463,6 +528,9 @@ class Parser:
         info["period_with_the_employer_from"] = row9[3].replace("From\n", "")
         info["period_with_the_employer_to"] = row9[4].replace("To\n", "")
 
+        if header_only:
+            return info
+
         # flatten the tables
         all_rows = []
         replace_rows_2_and_1 = False
@@ -472,6 +540,7 @@ class Parser:
             is_valid_table = Parser.is_valid_table(table_type)
             if not is_valid_table:
                 logger.debug(f"skipping table with first row: {table.first_table_row}")
+                SKIPPED_TABLES.inc(table_type=table_type)
                 continue
             
             # Fix(2021): Annexure row is not present 
@@ -495,21 +564,9 @@ class Parser:
             if table_type in ("PARTB_ANNEXURE1_1_FY2425", "PARTB_ANNEXURE1_2_FY2425"):
                 gather_extra_rows = True
 
-            ridx = 0
-            while ridx<len(table.dataframe):
-                row = table.dataframe.iloc[ridx].to_list()
-                row_ = []
-                if not Parser.is_valid_part_b_row(row):
-                    ridx+=1
-                    continue
-                for cell in row:
-                    if cell is not None:
-                        if not ((len(str(cell)) in (4, 5)) and (str(cell).startswith("Col"))):
-                            row_.append(cell)
-                        else:
-                            row_.append("")
-                all_rows.append(row_)
-                ridx+=1
+            for row, normalized_row in zip(table.rows, table.normalized_rows):
+                if Parser.is_valid_part_b_row(row):
+                    all_rows.append(list(normalized_row))
 
         # Fix: replace the empty headers
         all_rows[36] = [c for c in all_rows[36] if c != ""]
@@ -734,52 +791,260 @@ class Parser:
         return info
 
 
-    def parse(self, filepath: str | Path, return_output: bool = False) -> None | dict:
-        pdf = PDF(filepath)
-        if not Parser.is_form16(pdf):
-            raise Exception("Input is not an official PDF file of form 16. ")
-        
-        parts = Parser.parts_info(pdf, return_offset=True)
+    @staticmethod
+    def plan_fields(fields):
+        """Work out how much of each part is needed for the dotted `fields`.
+
+        Returns a mapping of part name to `None` (not needed), `"header"`
+        (first table only) or `"full"`.
+        """
+        plan = {"part_a": None, "part_b": None}
+        header_fields = {
+            "part_a": Parser.HEADER_FIELDS_PARTA,
+            "part_b": Parser.HEADER_FIELDS_PARTB,
+        }
+        for field in fields:
+            part, _, rest = field.partition(".")
+            if part not in plan:
+                raise ValueError(f"Unknown field: {field!r}. Fields must start with 'part_a' or 'part_b'.")
+            if rest in header_fields[part]:
+                plan[part] = plan[part] or "header"
+            else:
+                plan[part] = "full"
+        return plan
+
+    @staticmethod
+    def plan_pages(pdf, plan):
+        """Pages to run table detection on for `plan`, located through the
+        text layer, along with the page each part starts on. Returns
+        `(None, None)` if the parts cannot be located this way."""
+        starts = {}
+        for part, heading in Parser.PART_HEADINGS.items():
+            pages = pdf.find_pages(heading)
+            if len(pages)>1:
+                return None, None
+            starts[part] = pages[0] if pages else None
+
+        pages = {0} # Needed to validate the form
+        for part, level in plan.items():
+            if level is None:
+                continue
+            if starts[part] is None:
+                # Absent, or its heading is not in the text layer: search every page
+                return None, None
+            beg = starts[part]
+            if level == "header":
+                pages.add(beg)
+                continue
+            # Note: the next part may start on the page this one ends on
+            later = [p for p in starts.values() if p is not None and p>beg]
+            end = min(later) if later else pdf.page_count - 1
+            pages.update(range(beg, end + 1))
+        return sorted(pages), starts
+
+    @staticmethod
+    def project(info, fields):
+        """Copy the dotted `fields` out of a parsed `info` keeping the nesting.
+        Fields missing in the document are left out, like missing parts."""
+        projected = {}
+        for field in fields:
+            keys = field.split(".")
+            value = info
+            for key in keys:
+                if not isinstance(value, dict) or key not in value:
+                    break
+                value = value[key]
+            else:
+                dst = projected
+                for key in keys[:-1]:
+                    dst = dst.setdefault(key, {})
+                dst[keys[-1]] = value
+        return projected
+
+    def parse(
+        self,
+        filepath: str | Path,
+        return_output: bool = False,
+        fields: list[str] | None = None,
+        timeout: float | None = None,
+        max_pages: int | None = None,
+        max_tables: int | None = None,
+    ) -> None | dict:
+        budget = None
+        if timeout is not None or max_pages is not None or max_tables is not None:
+            budget = Budget(timeout=timeout, max_pages=max_pages, max_tables=max_tables)
+
+        def replay(pdf):
+            # The last attempt again, with its backend and layout profile
+            limits = Budget(timeout=timeout, max_pages=max_pages, max_tables=max_tables) if budget is not None else None
+            again = PDF(filepath, layout=pdf.layout, budget=limits, backend=pdf.backend)
+            try:
+                self.parse_pdf(again, fields=fields)
+            finally:
+                again.clear()
+
+        with recorded_document(), self.watch(filepath, replay) as watch:
+            with timed_stage("open"):
+                pdf = watch.pdf = PDF(filepath, budget=budget)
+            key = None
+            if self.layout_store is not None:
+                key = layout_key(pdf)
+                if key is not None:
+                    pdf.layout = self.layout_store.get(key)
+            pdf.backend = self.backends.select(pdf)
+            EXTRACTION_BACKENDS.inc(backend=pdf.backend.name)
+
+            try:
+                try:
+                    info = self.parse_pdf(pdf, fields=fields)
+                except BudgetExceededError:
+                    raise
+                except Exception as e:
+                    if pdf.backend is not self.backends.default:
+                        logger.warning(f"Parsing with the {pdf.backend.name} backend failed ({e!r}), retrying with a full table search.")
+                        if pdf.backend is self.backends.cache:
+                            self.backends.cache.discard(pdf)
+                    elif pdf.layout is not None:
+                        logger.warning(f"Parsing with the layout profile failed ({e!r}), retrying with a full table search.")
+                        self.layout_store.discard(key)
+                    else:
+                        raise
+                    pdf.clear()
+                    retry_budget = budget.retry() if budget is not None else None
+                    pdf = watch.pdf = PDF(filepath, budget=retry_budget, backend=self.backends.default)
+                    EXTRACTION_BACKENDS.inc(backend=pdf.backend.name)
+                    info = self.parse_pdf(pdf, fields=fields)
+            except BudgetExceededError as e:
+                pdf.clear()
+                e.diagnostics.update(Parser.extraction_diagnostics(pdf))
+                raise
+
+            if key is not None:
+                self.update_layout(key, pdf)
+            if self.backends.cache is not None:
+                # Also the pages a cached document had to extract
+                self.backends.cache.store(pdf)
+        return info
+
+    @staticmethod
+    def extraction_diagnostics(pdf: PDF):
+        return {
+            "page_count": pdf.page_count,
+            "producer": pdf.producer,
+            "backend": pdf.backend.name,
+            "table_types": {
+                page_number: [Parser.table_typle(table) for table in tables]
+                for page_number, tables in sorted(pdf.extracted_page_tables.items())
+            },
+        }
+
+    def watch(self, filepath: str | Path, replay=None):
+        if self.capture is None:
+            return nullcontext(Watch())
+        return self.capture.watch(filepath, classify=Parser.table_typle, replay=replay)
+
+    def update_layout(self, key: str, pdf: PDF):
+        # Learn from the pages that were searched without a usable profile
+        profile = pdf.layout
+        new_pages = set(pdf.extracted_page_tables) - set(profile.pages if profile else ())
+        if profile is not None and not new_pages and not pdf.layout_fallback:
+            return
+        # Merged with the stored profile, which other workers may have updated
+        self.layout_store.merge(key, LayoutProfile.learn(pdf.extracted_page_tables))
+
+    def parse_pdf(self, pdf: PDF, fields: list[str] | None = None) -> dict:
+        with timed_stage("extract"):
+            tables = self.extract(pdf, fields=fields)
+        DOCUMENT_PAGES.observe(pdf.page_count)
+        DOCUMENT_TABLES.observe(len(tables))
+
+        info = self._parse_tables(tables, fields=fields)
+        pdf.clear()
+        return info
+
+    def extract(self, pdf: PDF, fields: list[str] | None = None) -> list[Table]:
+        tables = None
+        if fields is not None:
+            plan = Parser.plan_fields(fields)
+            pages, starts = Parser.plan_pages(pdf, plan)
+            if pages is not None:
+                tables = pdf.tables_on_pages(pages)
+                found = Parser.parts_info_from_tables(tables)
+                # Fall back to every page if a part is not where the text layer said
+                for part in plan:
+                    if starts[part] is not None and not found[part]["available"] and plan[part] is not None:
+                        tables = None
+                if not (found["part_a"]["available"] or found["part_b"]["available"]):
+                    tables = None
+            if tables is None:
+                logger.debug("Could not locate the requested parts by page, extracting every page.")
+        if tables is None:
+            tables = pdf.tables
+        return tables
+
+    def parse_tables(self, tables: list[Table], fields: list[str] | None = None) -> dict:
+        """Parse tables extracted earlier, e.g. with `extract_tables` in
+        another process."""
+        with recorded_document():
+            DOCUMENT_TABLES.observe(len(tables))
+            info = self._parse_tables(tables, fields=fields)
+        return info
+
+    def _parse_tables(self, tables: list[Table], fields: list[str] | None = None) -> dict:
+        plan = Parser.plan_fields(fields) if fields is not None else {"part_a": "full", "part_b": "full"}
+
+        with timed_stage("validate"):
+            if not Parser.is_form16(None, tables):
+                raise NotForm16Error("Input is not an official PDF file of form 16. ")
+            parts = Parser.parts_info_from_tables(tables, return_offset=True)
+
         if parts["part_a"]["available"] and parts["part_b"]["available"]:
             if parts["part_a"]["table_index"]>parts["part_b"]["table_index"]:
                 logger.warning("Part B is present before Part A")
                 atidx = parts["part_a"]["table_index"]
-                part_b_tables = pdf.tables[:atidx]
-                part_a_tables = pdf.tables[atidx:]
+                part_b_tables = tables[:atidx]
+                part_a_tables = tables[atidx:]
             else:
                 btidx = parts["part_b"]["table_index"]
-                part_a_tables = pdf.tables[:btidx]
-                part_b_tables = pdf.tables[btidx:]
-
-            a_info = self.parse_a(part_a_tables)
-            b_info = self.parse_b(part_b_tables)
-            pdf.clear()
-
-            return {
-                "part_a": a_info,
-                "part_b": b_info,
-            }
+                part_a_tables = tables[:btidx]
+                part_b_tables = tables[btidx:]
         
         elif parts["part_a"]["available"] and not parts["part_b"]["available"]:
-            a_info = self.parse_a(pdf.tables)
-            pdf.clear()
-            return {
-                "part_a": a_info,
-            }
+            part_a_tables, part_b_tables = tables, None
         
         elif not parts["part_a"]["available"] and parts["part_b"]["available"]:
-            b_info = self.parse_b(pdf.tables)
-            pdf.clear()
-            return {
-                "part_b": b_info,
-            }
+            part_a_tables, part_b_tables = None, tables
         
         else:
             raise Exception("Either PART A or PART B must be present in the form.")
+
+        info = {}
+        if part_a_tables is not None and plan["part_a"] is not None:
+            with timed_stage("parse_a"):
+                info["part_a"] = self.parse_a(part_a_tables, header_only=plan["part_a"]=="header")
+        if part_b_tables is not None and plan["part_b"] is not None:
+            with timed_stage("parse_b"):
+                info["part_b"] = self.parse_b(part_b_tables, header_only=plan["part_b"]=="header")
+
+        if fields is not None:
+            info = Parser.project(info, fields)
+        return info
             
 
 
 
-def build_parser():
-    p = Parser()
+def build_parser(
+    layout_store: LayoutStore | str | Path | None = None,
+    capture: SlowDocumentCapture | str | Path | None = None,
+    backends: BackendSelector | None = None,
+):
+    if isinstance(layout_store, (str, Path)):
+        layout_store = LayoutStore(layout_store)
+    if isinstance(capture, (str, Path)):
+        capture = SlowDocumentCapture(capture)
+    p = Parser(
+        layout_store=layout_store,
+        capture=capture,
+        backends=backends,
+    )
     return p
\ No newline at end of file
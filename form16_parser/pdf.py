@@ -1,35 +1,108 @@
+import hashlib
+import threading
 from pathlib import Path
 
-from form16_parser.table import Table
+from form16_parser.backends import Backend, PyMuPDFBackend
+from form16_parser.budget import Budget
+from form16_parser.layout import LayoutProfile
 import fitz
 import pymupdf
 
 
+def content_hash(filepath: str | Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# PyMuPDF is not thread-safe, even across different documents. Every call
+# into it goes through this lock so that threads can share the process.
+MUPDF_LOCK = threading.RLock()
+
+
 class PDF:
-    def __init__(self, filepath: str | Path) -> None:
+    def __init__(
+        self,
+        filepath: str | Path,
+        layout: LayoutProfile | None = None,
+        budget: Budget | None = None,
+        backend: Backend | None = None,
+    ) -> None:
         self._filepath = filepath
-        self._doc = fitz.open(str(self._filepath))
+        with MUPDF_LOCK:
+            self._doc = fitz.open(str(self._filepath))
+            # Kept so they can be reported after the document is closed
+            self._page_count = self._doc.page_count
+            self._producer = (self._doc.metadata or {}).get("producer") or ""
         self._tables = None
+        self._page_tables = {}
+        self.layout = layout
+        self.layout_fallback = False
+        self.budget = budget
+        self.backend = backend if backend is not None else PyMuPDFBackend()
+        self._content_hash = None
         self._first_columns = None
 
     def clear(self):
-        self._doc.close()
+        with MUPDF_LOCK:
+            self._doc.close()
 
     @property
-    def tables(self):
-        if self._tables is None:
-            tables = []
-            first_table_columns = []
-            for page in self._doc:
+    def page_count(self):
+        return self._page_count
+
+    @property
+    def producer(self):
+        return self._producer
+
+    @property
+    def content_hash(self):
+        if self._content_hash is None:
+            self._content_hash = content_hash(self._filepath)
+        return self._content_hash
+
+    @property
+    def extracted_page_tables(self):
+        return self._page_tables
+
+    def page_text(self, page_number: int):
+        with MUPDF_LOCK:
+            return self._doc[page_number].get_text()
+
+    def find_pages(self, text: str):
+        """Page numbers whose text layer contains `text`. This is much cheaper
+        than table detection and is used to decide which pages to extract."""
+        with MUPDF_LOCK:
+            return [page.number for page in self._doc if text in page.get_text()]
+
+    def page_tables(self, page_number: int):
+        if page_number not in self._page_tables:
+            if self.budget is not None:
+                self.budget.before_page()
+            with MUPDF_LOCK:
+                page = self._doc[page_number]
                 if page.first_widget:
                     page.delete_widget(page.first_widget) # Remove: "Signature" box
-                for pymu_table in page.find_tables().tables:
-                    df = pymu_table.to_pandas().reset_index().T.reset_index().T
-                    table = Table(df=df, page=page)
-                    first_table_columns.append(table.first_table_column)
-                    tables.append(table)
+                tables = self.backend.page_tables(self, page, page_number)
+            self._page_tables[page_number] = tables
+            if self.budget is not None:
+                self.budget.after_page(len(tables))
+        return self._page_tables[page_number]
+
+    def tables_on_pages(self, page_numbers):
+        tables = []
+        for page_number in sorted(set(page_numbers)):
+            tables.extend(self.page_tables(page_number))
+        return tables
+
+    @property
+    def tables(self):
+        if self._tables is None:
+            tables = self.tables_on_pages(range(self.page_count))
             self._tables = tables
-            self._first_table_columns = first_table_columns
+            self._first_table_columns = [table.first_table_column for table in tables]
         return self._tables
     
     @tables.setter
@@ -41,4 +114,17 @@ class PDF:
         if self._tables is None:
             # Creating tables creates self._first_table_columns
             _ = self.tables
-        return self._first_table_columns
\ No newline at end of file
+        return self._first_table_columns
+
+
+def extract_tables(filepath: str | Path, layout: LayoutProfile | None = None):
+    """Extract the tables of every page and close the document.
+
+    The returned tables do not reference the document and can be pickled,
+    cached or sent to another process for `Parser.parse_tables`.
+    """
+    pdf = PDF(filepath, layout=layout)
+    try:
+        return pdf.tables
+    finally:
+        pdf.clear()
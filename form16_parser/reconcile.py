@@ -0,0 +1,195 @@
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+
+SUMMARY = ("part_a", "summary_of_amount_paid_or_credited_and_tax_deducted")
+SECTION1 = ("part_a", "section_1_tax_deducted_and_deposited_through_book_adjustment")
+SECTION2 = ("part_a", "section_2_tax_deducted_and_deposited_through_challan")
+DETAILS = ("part_b", "details_of_salary_paid_and_any_other_income_and_tax_deducted")
+GROSS_SALARY = (*DETAILS, "gross_salary")
+
+QUARTERS = ("q1", "q2", "q3", "q4")
+
+# (quarter column, total column) of the Part A summary
+SUMMARY_COLUMNS = (
+    ("amt_paid_or_credited", "total_amt_paid_or_credited"),
+    ("amt_of_tax_deducted", "total_amt_of_tax_deducted"),
+    ("amt_of_tax_deposited_or_remitted", "total_amt_of_tax_deposited_or_remitted"),
+)
+
+GROSS_SALARY_COMPONENTS = (
+    "salary_as_per_provisions_contained_in_section_17_1",
+    "value_of_perquisites_under_section_17_2",
+    "profits_in_lieu_of_salary_under_section_17_3",
+)
+
+# Columns of the amounts read from every result
+SUMMARY_FIELDS = [(q, column) for q in QUARTERS for column, _ in SUMMARY_COLUMNS]
+SUMMARY_TOTAL_FIELDS = [total for _, total in SUMMARY_COLUMNS]
+COLUMN = {
+    field: i
+    for i, field in enumerate((
+        *SUMMARY_FIELDS,
+        *[("total", total) for total in SUMMARY_TOTAL_FIELDS],
+        *[(component, i) for component in GROSS_SALARY_COMPONENTS for i in (0, 1)],
+        "gross_salary_total",
+        "net_tax_payable",
+    ))
+}
+
+MISMATCH_COLUMNS = ["index", "certificate_num", "check", "expected", "actual"]
+
+
+def _get(result, path):
+    value = result
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
+
+
+_quarter_amounts = itemgetter(*[column for column, _ in SUMMARY_COLUMNS])
+_total_amounts = itemgetter(*SUMMARY_TOTAL_FIELDS)
+_MISSING_QUARTER = (None,) * len(SUMMARY_COLUMNS)
+
+
+def _amount_fields(result):
+    """The amounts of `result` in `COLUMN` order."""
+    part_a = result.get("part_a") or {}
+    part_b = result.get("part_b") or {}
+    summary = part_a.get(SUMMARY[1]) or {}
+    details = part_b.get(DETAILS[1]) or {}
+    gross_salary = details.get(GROSS_SALARY[2]) or {}
+
+    values = []
+    for q in QUARTERS:
+        quarter = summary.get(q)
+        values.extend(_quarter_amounts(quarter) if quarter else _MISSING_QUARTER)
+    total = summary.get("total")
+    values.extend(_total_amounts(total) if total else _MISSING_QUARTER)
+    for component in GROSS_SALARY_COMPONENTS:
+        pair = gross_salary.get(component)
+        values.extend(pair if isinstance(pair, list) and len(pair)==2 else (None, None))
+    values.append(gross_salary.get("total"))
+    values.append(details.get("net_tax_payable"))
+    return values
+
+
+def to_amounts(values):
+    """Convert amount strings such as "1,23,456.00" to floats, NaN if missing."""
+    amounts = np.array(values, dtype=object)
+    amounts[(amounts==None) | (amounts=="")] = "nan"
+    try:
+        return amounts.astype(float)
+    except (TypeError, ValueError):
+        pass
+    # Slow path: thousands separators or text in some of the cells
+    series = pd.Series(amounts).astype(str).str.replace(",", "", regex=False).str.strip()
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+
+
+def _section_totals(amounts, segments, totals, n):
+    """Sum of the row amounts and the reported total of a Part A section."""
+    amounts = np.nan_to_num(to_amounts(amounts))
+    row_sums = np.bincount(np.asarray(segments, dtype=np.intp), weights=amounts, minlength=n)
+    return row_sums, to_amounts(totals)
+
+
+def _collect(results):
+    """Everything the checks read from the batch, in a single pass: the
+    amount fields, the rows of each Part A section and the certificate
+    numbers."""
+    values = []
+    # path -> (row amounts, result index of each row, reported totals)
+    sections = {SECTION1: ([], [], []), SECTION2: ([], [], [])}
+    certificate_nums = []
+    for i, result in enumerate(results):
+        values.extend(_amount_fields(result))
+        for path, (amounts, segments, totals) in sections.items():
+            total = None
+            for row in _get(result, path) or []:
+                if "total" in row:
+                    total = row["total"]
+                else:
+                    amounts.append(row.get("tax_deposited_in_respect_of_the_deductee"))
+                    segments.append(i)
+            totals.append(total)
+        certificate_nums.append(
+            _get(result, ("part_a", "certificate_num")) or _get(result, ("part_b", "certificate_num"))
+        )
+    return values, sections, certificate_nums
+
+
+def _first_available(a, b):
+    return np.where(np.isnan(a), b, a)
+
+
+def reconcile(results, tolerance: float = 1.0) -> pd.DataFrame:
+    """Check a batch of parse results for internal consistency.
+
+    All checks run over NumPy arrays built from the batch in one pass:
+
+    - the Part A quarterly summary against its total, per column
+    - the Part A section I and section II rows against their totals
+    - the tax deducted in the Part A summary against the Part B net tax payable
+    - the Part B gross salary components against the gross salary total
+
+    Checks with a missing side are skipped. Returns one row per mismatch
+    with the index of the result in the batch, its certificate number, the
+    check name and the expected (reported) and actual (derived) amounts.
+    """
+    results = list(results)
+    n = len(results)
+    if n==0:
+        return pd.DataFrame(columns=MISMATCH_COLUMNS)
+
+    values, sections, certificate_nums = _collect(results)
+    values = to_amounts(values).reshape(n, len(COLUMN))
+    certificate_nums = np.array(certificate_nums, dtype=object)
+
+    def column(field):
+        return values[:, COLUMN[field]]
+
+    checks = []
+    for quarter_column, total_column in SUMMARY_COLUMNS:
+        quarters = values[:, [COLUMN[(q, quarter_column)] for q in QUARTERS]]
+        # Forms may start from a later quarter, only all-missing rows are skipped
+        quarter_sums = np.where(np.isnan(quarters).all(axis=1), np.nan, np.nansum(quarters, axis=1))
+        checks.append((f"summary.{total_column}", column(("total", total_column)), quarter_sums))
+
+    for name, path in (("section_1.total", SECTION1), ("section_2.total", SECTION2)):
+        row_sums, totals = _section_totals(*sections[path], n)
+        checks.append((name, totals, row_sums))
+
+    checks.append((
+        "net_tax_payable",
+        column("net_tax_payable"),
+        column(("total", "total_amt_of_tax_deducted")),
+    ))
+
+    components = np.stack([
+        _first_available(column((component, 0)), column((component, 1)))
+        for component in GROSS_SALARY_COMPONENTS
+    ], axis=1)
+    component_sums = np.where(np.isnan(components).all(axis=1), np.nan, np.nansum(components, axis=1))
+    checks.append(("gross_salary.total", column("gross_salary_total"), component_sums))
+
+    mismatches = []
+    for name, expected, actual in checks:
+        with np.errstate(invalid="ignore"):
+            idxs = np.flatnonzero(np.abs(expected - actual) > tolerance)
+        if len(idxs):
+            mismatches.append(pd.DataFrame({
+                "index": idxs,
+                "certificate_num": certificate_nums[idxs],
+                "check": name,
+                "expected": expected[idxs],
+                "actual": actual[idxs],
+            }))
+    if not mismatches:
+        return pd.DataFrame(columns=MISMATCH_COLUMNS)
+    return pd.concat(mismatches, ignore_index=True)
@@ -1,44 +1,119 @@
+import hashlib
+import re
+
 import pandas as pd
 
+
+# Header names PyMuPDF makes up for empty header cells ("Col1", "Col2", ...)
+PLACEHOLDER_PATTERN = re.compile(r"Col.{1,2}", re.DOTALL)
+
+
 class Table:
-    def __init__(self, df, page):
-        self.page = page
-        self.dataframe = df
+    """A table extracted from a page.
 
-    @property
-    def page(self):
-        return self._page
-    
-    @page.setter
-    def page(self, new_page):
-        self._page = new_page
+    Holds only plain data (page number, bounding box and cells) and no
+    references into PyMuPDF, so tables can be pickled and parsed in
+    another process than the one that extracted them.
+    """
+
+    def __init__(self, df=None, page_number: int = -1, bbox=None, rows=None):
+        self.page_number = page_number
+        self.bbox = bbox
+        if df is not None:
+            self.dataframe = df
+        elif rows is not None:
+            self._dataframe = None
+            self._rows = rows
+            self._compact_rows = None
+            self._normalized_rows = None
+        else:
+            raise ValueError("Either a pandas DataFrame or rows must be given")
+
+    def __getstate__(self):
+        # Rows pickle much cheaper than the DataFrame, which is rebuilt on demand
+        return {
+            "page_number": self.page_number,
+            "bbox": self.bbox,
+            "rows": self.rows,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(
+            page_number=state["page_number"],
+            bbox=state["bbox"],
+            rows=state["rows"],
+        )
+
+    def to_dict(self):
+        return {
+            **self.__getstate__(),
+            "fingerprint": self.fingerprint,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        bbox = data.get("bbox")
+        return cls(
+            page_number=data.get("page_number", -1),
+            bbox=tuple(bbox) if bbox is not None else None,
+            rows=data["rows"],
+        )
 
     @property
-    def page_number(self):
-        if not self.page:
-            return -1
-        return self.page.number
+    def fingerprint(self):
+        """Short hash of the header row, identical for tables of the same kind."""
+        header = "\x1f".join("" if c is None else str(c) for c in self.rows[0][1:])
+        return hashlib.blake2b(header.encode(), digest_size=8).hexdigest()
         
     @property
     def dataframe(self):
+        if self._dataframe is None:
+            self._dataframe = pd.DataFrame(self._rows)
         return self._dataframe
     
     @dataframe.setter
     def dataframe(self, new_dataframe):
         if isinstance(new_dataframe, pd.DataFrame):
             self._dataframe = new_dataframe
+            self._rows = None
+            self._compact_rows = None
+            self._normalized_rows = None
         else:
             raise ValueError("Data must be a pandas DataFrame")
+
+    @property
+    def rows(self):
+        """Raw rows as lists, including the index column and `None` cells."""
+        if self._rows is None:
+            self._rows = self.dataframe.to_numpy(dtype=object).tolist()
+        return self._rows
+
+    @property
+    def compact_rows(self):
+        """Rows with the `None` cells dropped."""
+        if self._compact_rows is None:
+            self._compact_rows = [[c for c in row if c is not None] for row in self.rows]
+        return self._compact_rows
+
+    @property
+    def normalized_rows(self):
+        """Compact rows with the header placeholders blanked out."""
+        if self._normalized_rows is None:
+            self._normalized_rows = [
+                ["" if isinstance(c, str) and PLACEHOLDER_PATTERN.fullmatch(c) else c for c in row]
+                for row in self.compact_rows
+            ]
+        return self._normalized_rows
     
     @property
     def first_table_cell(self):
-        # Note: self.dataframe.iloc[0][0] contains index
-        return self.dataframe.iloc[0][1]
+        # Note: self.rows[0][0] contains index
+        return self.rows[0][1]
     
     @property
     def first_table_column(self):
-        return self.dataframe.iloc[:,1].to_list()
+        return [row[1] for row in self.rows]
     
     @property
     def first_table_row(self):
-        return self.dataframe.iloc[0, :].to_list()
\ No newline at end of file
+        return self.rows[0]
\ No newline at end of file
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from form16_parser import BatchResult, ResultArchive
+
+
+LEGEND = [{"legend": "Long legend text used in every certificate", "description": "Some description"}] * 5
+
+
+def result(i):
+    header = {
+        "certificate_num": f"CERT{i:05d}",
+        "pan_of_the_employee_or_specified_senior_citizen": f"PAN{i % 7}",
+        "tan_of_the_deductor": f"TAN{i % 3}",
+        "assesment_year": "2024-25",
+    }
+    return {"part_a": {**header, "legend_used_in_form_16": LEGEND}, "part_b": {**header, "amount": i * 1.5}}
+
+
+def test_roundtrip_and_lookup(tmp_path):
+    filepath = tmp_path / "results.f16a"
+    with ResultArchive(filepath, block_size=16) as archive:
+        archive.extend(result(i) for i in range(100))
+        assert archive.get("CERT00042") == result(42)
+
+    with ResultArchive(filepath, readonly=True) as archive:
+        assert len(archive) == 100
+        assert [r for _, r in archive.scan()] == [result(i) for i in range(100)]
+        assert [r["part_a"]["certificate_num"] for _, r in archive.find(pan="PAN3", tan="TAN0")] == [
+            f"CERT{i:05d}" for i in range(100) if i % 7 == 3 and i % 3 == 0
+        ]
+        with pytest.raises(KeyError):
+            archive.get("missing")
+
+    pretty = sum(len(json.dumps(result(i), indent=4)) for i in range(100))
+    assert filepath.stat().st_size < pretty / 10
+
+
+def test_append_batch_results_and_reindex(tmp_path):
+    filepath = tmp_path / "results.f16a"
+    with ResultArchive(filepath) as archive:
+        archive.extend([
+            BatchResult("a.pdf", result(1), None),
+            BatchResult("b.pdf", None, ValueError("bad")),
+        ])
+    with ResultArchive(filepath) as archive:
+        archive.append(result(2), path="c.pdf")
+
+    (tmp_path / "results.f16a.idx").unlink()
+    with ResultArchive(filepath) as archive:
+        assert [path for path, _ in archive.scan()] == ["a.pdf", "c.pdf"]
+        assert archive.get("CERT00002") == result(2)
+
+
+def test_interrupted_write_is_dropped(tmp_path):
+    filepath = tmp_path / "results.f16a"
+    with ResultArchive(filepath) as archive:
+        archive.append(result(1))
+    with open(filepath, "ab") as fp:
+        fp.write(b"B\x00\x00\x01\x00torn")
+    with ResultArchive(filepath) as archive:
+        archive.append(result(2))
+    with ResultArchive(filepath, readonly=True) as archive:
+        assert [r for _, r in archive.scan()] == [result(1), result(2)]
@@ -0,0 +1,108 @@
+import fitz
+import pytest
+
+from form16_parser import BackendSelector, CachedBackend, Parser, PyMuPDFBackend, TextLayerBackend, build_parser
+from form16_parser.pdf import PDF
+
+
+CELLS = [
+    # (x0, y0, x1, y1, text)
+    (40, 40, 200, 60, "FORM NO. 16"), (200, 40, 400, 60, ""),
+    (40, 60, 200, 100, "Name and address of the employer spanning two rows and wrapping"),
+    (200, 60, 400, 80, "PAN of the Deductor"), (200, 80, 400, 100, "AAAPA1234A"),
+    (40, 100, 120, 120, "Q1"), (120, 100, 200, 120, "100.00"), (200, 100, 400, 120, ""),
+    (40, 200, 340, 220, "Verification"),
+    (40, 220, 190, 240, "Place"), (190, 220, 340, 240, "PUNE"),
+]
+
+
+@pytest.fixture
+def document(tmp_path):
+    filepath = tmp_path / "tables.pdf"
+    doc = fitz.open()
+    page = doc.new_page()
+    for x0, y0, x1, y1, text in CELLS:
+        rect = fitz.Rect(x0, y0, x1, y1)
+        page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+        if text:
+            page.insert_textbox(rect + (2, 2, -2, -2), text, fontsize=6)
+    doc.set_metadata({"producer": "TRACES"})
+    doc.save(str(filepath))
+    return filepath
+
+
+def rows(filepath, backend):
+    pdf = PDF(filepath, backend=backend)
+    try:
+        return [(table.rows, table.bbox) for table in pdf.tables]
+    finally:
+        pdf.clear()
+
+
+def test_text_layer_matches_pymupdf(document):
+    expected = rows(document, PyMuPDFBackend())
+    assert len(expected) == 2
+    assert rows(document, TextLayerBackend()) == expected
+
+
+def test_cached_backend_replays_tables(tmp_path, document, monkeypatch):
+    cache = CachedBackend(tmp_path / "cache")
+    pdf = PDF(document)
+    expected = [table.rows for table in pdf.tables]
+    cache.store(pdf)
+    pdf.clear()
+
+    def fail(*args):
+        raise AssertionError("Tables must come from the cache")
+
+    loads = []
+    load = cache._load
+    monkeypatch.setattr(PyMuPDFBackend, "page_tables", fail)
+    monkeypatch.setattr(cache, "_load", lambda pdf: loads.append(pdf) or load(pdf))
+    pdf = PDF(document, backend=cache)
+    assert BackendSelector(cache=cache).select(pdf) is cache
+    assert [table.rows for table in pdf.tables] == expected
+    assert len(loads) == 1
+
+
+def test_cached_backend_prune(tmp_path, document):
+    cache = CachedBackend(tmp_path / "cache")
+    pdf = PDF(document)
+    pdf.tables
+    cache.store(pdf)
+    pdf.clear()
+    assert cache.prune(max_bytes=1 << 20) == 0
+    assert cache.has(pdf)
+    assert cache.prune(max_bytes=0) == 1
+    assert not cache.has(pdf)
+
+
+def test_selector(document):
+    pdf = PDF(document)
+    assert BackendSelector().select(pdf).name == "pymupdf"
+    assert BackendSelector(text_producers=["^TRACES"]).select(pdf).name == "text"
+    assert BackendSelector(text_producers=["^TRACES"], max_text_pages=0).select(pdf).name == "pymupdf"
+    pdf.clear()
+
+
+def test_cached_backend_stores_pages_it_extracted(tmp_path, document, monkeypatch):
+    filepath = tmp_path / "two-pages.pdf"
+    doc = fitz.open(str(document))
+    doc.fullcopy_page(0)
+    doc.save(str(filepath))
+
+    cache = CachedBackend(tmp_path / "cache")
+    pdf = PDF(filepath)
+    pdf.tables_on_pages([0])
+    cache.store(pdf)
+    pdf.clear()
+
+    def parse_pdf(self, pdf, fields=None):
+        assert pdf.backend is cache
+        return {"num_tables": len(pdf.tables)}
+
+    # Page 1 is not cached yet: extracted by PyMuPDF, then added to the entry
+    monkeypatch.setattr(Parser, "parse_pdf", parse_pdf)
+    parser = build_parser(backends=BackendSelector(cache=cache))
+    assert parser.parse(filepath, return_output=True) == {"num_tables": 4}
+    assert set(cache._load(pdf)["pages"]) == {"0", "1"}
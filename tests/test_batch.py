@@ -0,0 +1,49 @@
+import multiprocessing
+import time
+from pathlib import Path
+
+import pytest
+
+from form16_parser import BudgetExceededError, Parser, parse_many
+
+
+@pytest.mark.parametrize("executor", ["serial", "thread", "process"])
+def test_failures_are_returned_in_order(tmp_path, executor):
+    filepaths = [tmp_path / f"{i}.pdf" for i in range(5)]
+    results = list(parse_many(filepaths, executor=executor, max_workers=2))
+    assert [r.path for r in results] == [str(p) for p in filepaths]
+    assert all(r.result is None and r.error is not None for r in results)
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        parse_many([], executor="gpu")
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="patches the parser of forked workers")
+def test_stalled_worker_is_killed(tmp_path, monkeypatch):
+    def parse(self, filepath, **kwargs):
+        if Path(filepath).stem == "stall":
+            time.sleep(60)
+        return {"path": str(filepath)}
+
+    monkeypatch.setattr(Parser, "parse", parse)
+    filepaths = [tmp_path / name for name in ("a.pdf", "stall.pdf", "b.pdf", "c.pdf")]
+    results = list(parse_many(filepaths, executor="process", max_workers=2, timeout=0.2, kill_grace=0.3))
+
+    assert [r.path for r in results] == [str(p) for p in filepaths]
+    assert isinstance(results[1].error, BudgetExceededError)
+    assert results[1].error.diagnostics["killed"]
+    assert [r.result for i, r in enumerate(results) if i != 1] == [{"path": str(p)} for i, p in enumerate(filepaths) if i != 1]
+
+
+def test_serial_batches_do_not_share_a_parser(tmp_path, monkeypatch):
+    def parse(self, filepath, fields=None, **kwargs):
+        return {"fields": fields, "max_pages": kwargs.get("max_pages")}
+
+    monkeypatch.setattr(Parser, "parse", parse)
+    first = parse_many([tmp_path / "a.pdf", tmp_path / "b.pdf"], executor="serial", fields=["part_a"], max_pages=2)
+    assert next(first).result == {"fields": ["part_a"], "max_pages": 2}
+    second = parse_many([tmp_path / "c.pdf"], executor="serial", fields=["part_b"])
+    assert next(second).result == {"fields": ["part_b"], "max_pages": None}
+    assert next(first).result == {"fields": ["part_a"], "max_pages": 2}
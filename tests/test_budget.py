@@ -0,0 +1,51 @@
+import fitz
+import pytest
+
+from form16_parser import BackendSelector, BudgetExceededError, NotForm16Error, TextLayerBackend, build_parser
+
+
+@pytest.fixture
+def document(tmp_path):
+    filepath = tmp_path / "three-pages.pdf"
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page().insert_text((72, 72), "Hello")
+    doc.save(str(filepath))
+    return filepath
+
+
+def test_max_pages(document):
+    with pytest.raises(BudgetExceededError) as excinfo:
+        build_parser().parse(document, max_pages=2)
+    e = excinfo.value
+    assert (e.budget, e.limit) == ("max_pages", 2)
+    assert e.diagnostics["pages_extracted"] == 2
+    assert e.diagnostics["page_count"] == 3
+    assert e.diagnostics["table_types"] == {0: [], 1: []}
+
+
+def test_timeout(document):
+    with pytest.raises(BudgetExceededError) as excinfo:
+        build_parser().parse(document, timeout=0)
+    assert excinfo.value.budget == "timeout"
+
+
+def test_retry_gets_a_fresh_page_budget(document):
+    # The text-layer attempt fails and the full search retries every page
+    parser = build_parser(backends=BackendSelector(text_producers=[""]))
+    with pytest.raises(NotForm16Error):
+        parser.parse(document, max_pages=3)
+
+
+def test_budget_exceeded_in_retry_has_diagnostics(document, monkeypatch):
+    def fail(*args):
+        raise ValueError("no grid")
+
+    monkeypatch.setattr(TextLayerBackend, "page_tables", fail)
+    parser = build_parser(backends=BackendSelector(text_producers=[""]))
+    with pytest.raises(BudgetExceededError) as excinfo:
+        parser.parse(document, max_pages=2)
+    e = excinfo.value
+    assert e.diagnostics["backend"] == "pymupdf"
+    assert e.diagnostics["pages_extracted"] == 2
+    assert e.diagnostics["page_count"] == 3
@@ -0,0 +1,80 @@
+import json
+import pstats
+import threading
+
+import fitz
+import pytest
+
+from form16_parser import NotForm16Error, SlowDocumentCapture, build_parser
+from form16_parser.capture import content_hash
+from form16_parser.metrics import STAGE_DURATION
+
+
+@pytest.fixture
+def document(tmp_path):
+    filepath = tmp_path / "not-form16.pdf"
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Hello")
+    doc.save(str(filepath))
+    return filepath
+
+
+def test_slow_document_is_captured(tmp_path, document):
+    capture = SlowDocumentCapture(tmp_path / "captures", latency_threshold=0, profile=True)
+    parser = build_parser(capture=capture)
+    with pytest.raises(NotForm16Error):
+        parser.parse(document)
+    capture.wait()
+
+    target = tmp_path / "captures" / content_hash(document)
+    with open(target / "report.json") as fp:
+        report = json.load(fp)
+    assert report["page_count"] == 1
+    assert report["table_count"] == 0
+    assert [s["stage"] for s in report["stages"]] == ["open", "extract", "validate"]
+    assert "NotForm16Error" in report["error"]
+    assert (target / "profile.pstats").exists()
+
+
+def test_capture_limits(tmp_path, document):
+    captures = tmp_path / "captures"
+    parser = build_parser(capture=SlowDocumentCapture(captures, latency_threshold=0, max_captures=0))
+    with pytest.raises(NotForm16Error):
+        parser.parse(document)
+    assert not any(captures.iterdir())
+
+    parser = build_parser(capture=SlowDocumentCapture(captures, latency_threshold=60))
+    with pytest.raises(NotForm16Error):
+        parser.parse(document)
+    assert not any(captures.iterdir())
+
+
+def extract_count():
+    return sum(value[-1] for labels, value in STAGE_DURATION.snapshot()["samples"] if labels == ["extract"])
+
+
+def test_capture_profiles_a_second_run(tmp_path, document, monkeypatch):
+    release = threading.Event()
+    profile = SlowDocumentCapture._profile
+
+    def blocked_profile(*args):
+        release.wait(10)
+        profile(*args)
+
+    monkeypatch.setattr(SlowDocumentCapture, "_profile", staticmethod(blocked_profile))
+    capture = SlowDocumentCapture(tmp_path / "captures", latency_threshold=0, profile=True)
+    parser = build_parser(capture=capture)
+    before = extract_count()
+    # The watched call does not wait for the profiled run
+    with pytest.raises(NotForm16Error):
+        parser.parse(document)
+    target = tmp_path / "captures" / content_hash(document)
+    assert (target / "report.json").exists()
+    assert not (target / "profile.pstats").exists()
+
+    release.set()
+    capture.wait()
+    # The profiled run is not counted in the metrics
+    assert extract_count() - before == 1
+    stats = pstats.Stats(str(target / "profile.pstats"))
+    assert any(name == "parse_pdf" for _, _, name in stats.stats)
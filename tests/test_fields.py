@@ -0,0 +1,105 @@
+import fitz
+import pytest
+
+from form16_parser import Parser, PyMuPDFBackend
+from form16_parser.pdf import PDF
+
+
+@pytest.mark.parametrize(
+    ("fields", "plan"),
+    [
+        (
+            ["part_a.pan_of_the_deductor", "part_a.tan_of_the_deductor"],
+            {"part_a": "header", "part_b": None},
+        ),
+        (
+            ["part_a.assesment_year", "part_b.details_of_salary_paid_and_any_other_income_and_tax_deducted.gross_total_income"],
+            {"part_a": "header", "part_b": "full"},
+        ),
+        (
+            ["part_a.verification.place", "part_a.certificate_num"],
+            {"part_a": "full", "part_b": None},
+        ),
+        (
+            ["part_b"],
+            {"part_a": None, "part_b": "full"},
+        ),
+        (
+            # Only Part A carries the employee reference number in its header
+            ["part_b.employee_ref_num_or_ppo_num_provided_by_employer"],
+            {"part_a": None, "part_b": "full"},
+        ),
+    ],
+)
+def test_plan_fields(fields, plan):
+    assert Parser.plan_fields(fields) == plan
+
+
+def test_plan_fields_unknown_part():
+    with pytest.raises(ValueError):
+        Parser.plan_fields(["pan_of_the_deductor"])
+
+
+def test_project():
+    info = {
+        "part_a": {
+            "pan_of_the_deductor": "AAAAA1111A",
+            "verification": {"place": "Mumbai", "date": "10-06-2024"},
+        },
+    }
+    projected = Parser.project(info, [
+        "part_a.pan_of_the_deductor",
+        "part_a.verification.place",
+        "part_a.verification.place.city",
+        "part_b.net_tax_payable",
+    ])
+    assert projected == {
+        "part_a": {
+            "pan_of_the_deductor": "AAAAA1111A",
+            "verification": {"place": "Mumbai"},
+        },
+    }
+
+
+class RecordingBackend(PyMuPDFBackend):
+    def __init__(self):
+        self.pages = []
+
+    def page_tables(self, pdf, page, page_number):
+        self.pages.append(page_number)
+        return super().page_tables(pdf, page, page_number)
+
+
+@pytest.fixture
+def document(tmp_path):
+    # Part A on page 0, filler on pages 1-2, Part B on page 3
+    filepath = tmp_path / "parts.pdf"
+    doc = fitz.open()
+    for cells in (["FORM NO. 16", "PART A"], ["Filler"], ["Filler"], ["PART B", "Annexure"]):
+        page = doc.new_page()
+        for i, text in enumerate(cells):
+            for x0, x1, cell in ((40, 200, text), (200, 300, "")):
+                rect = fitz.Rect(x0, 40 + 20 * i, x1, 60 + 20 * i)
+                page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                page.insert_textbox(rect + (2, 2, -2, -2), cell, fontsize=6)
+    doc.save(str(filepath))
+    return filepath
+
+
+def test_extract_only_needed_pages(document):
+    backend = RecordingBackend()
+    pdf = PDF(document, backend=backend)
+    Parser().extract(pdf, fields=["part_a.pan_of_the_deductor"])
+    pdf.clear()
+    assert backend.pages == [0]
+
+
+def test_extract_every_page_when_heading_is_not_in_text_layer(document, monkeypatch):
+    backend = RecordingBackend()
+    pdf = PDF(document, backend=backend)
+    find_pages = pdf.find_pages
+    monkeypatch.setattr(pdf, "find_pages", lambda text: [] if text == "PART B" else find_pages(text))
+    tables = Parser().extract(pdf, fields=["part_b.certificate_num"])
+    pdf.clear()
+    assert sorted(backend.pages) == [0, 1, 2, 3]
+    assert Parser.parts_info_from_tables(tables)["part_b"]["available"]
@@ -0,0 +1,78 @@
+import json
+import os
+
+from form16_parser import Manifest, Parser, ingest
+
+
+def test_incremental_ingest(tmp_path, monkeypatch):
+    parsed = []
+
+    def parse(self, filepath, **kwargs):
+        parsed.append(os.path.basename(filepath))
+        with open(filepath) as fp:
+            return {"content": fp.read()}
+
+    monkeypatch.setattr(Parser, "parse", parse)
+    source = tmp_path / "in"
+    (source / "sub").mkdir(parents=True)
+    for name in ("a.pdf", "b.PDF", "sub/c.pdf"):
+        (source / name).write_text(name)
+    (source / "notes.txt").write_text("ignored")
+    manifest, output = tmp_path / "manifest.db", tmp_path / "out"
+
+    def run(**kwargs):
+        parsed.clear()
+        return ingest(source, manifest, output, executor="serial", **kwargs)
+
+    stats = run()
+    assert (stats["new"], stats["parsed"]) == (3, 3)
+    with Manifest(manifest) as m:
+        with open(m.get(source / "sub" / "c.pdf")["result_location"]) as fp:
+            assert json.load(fp) == {"content": "sub/c.pdf"}
+
+    assert run()["parsed"] == 0 and parsed == []
+
+    (source / "a.pdf").write_text("a, replaced")
+    stat = os.stat(source / "b.PDF")
+    os.utime(source / "b.PDF", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    (source / "sub" / "c.pdf").unlink()
+    stats = run()
+    assert parsed == ["a.pdf"]
+    assert (stats["modified"], stats["unchanged"], stats["deleted"]) == (1, 1, 1)
+
+    stats = run(parser_version="new")
+    assert sorted(parsed) == ["a.pdf", "b.PDF"]
+    assert stats["outdated"] == 2
+
+
+def test_ingest_does_not_prune_an_empty_scan(tmp_path, monkeypatch):
+    monkeypatch.setattr(Parser, "parse", lambda self, filepath, **kwargs: {})
+    source = tmp_path / "in"
+    (source / "sub").mkdir(parents=True)
+    for name in ("a.pdf", "b.pdf", "sub/c.pdf"):
+        (source / name).write_text(name)
+    manifest, output = tmp_path / "manifest.db", tmp_path / "out"
+    assert ingest(source, manifest, output, executor="serial")["parsed"] == 3
+
+    # An unreadable subdirectory keeps its files
+    scandir = os.scandir
+
+    def unreadable_sub(path):
+        if os.path.basename(path) == "sub":
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", unreadable_sub)
+    stats = ingest(source, manifest, output, executor="serial")
+    assert (stats["skipped_directories"], stats["missing"], stats["deleted"]) == (1, 0, 0)
+    monkeypatch.setattr(os, "scandir", scandir)
+
+    # e.g. a share that is not mounted
+    for name in ("a.pdf", "b.pdf", "sub/c.pdf"):
+        (source / name).unlink()
+    stats = ingest(source, manifest, output, executor="serial")
+    assert (stats["missing"], stats["deleted"]) == (3, 0)
+    with Manifest(manifest) as m:
+        assert len(m.entries()) == 3
+
+    assert ingest(source, manifest, output, executor="serial", prune=True)["deleted"] == 3
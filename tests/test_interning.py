@@ -0,0 +1,27 @@
+import json
+
+from form16_parser.interning import InternPool
+
+
+def result(i):
+    verification = {"verification_text": "I, " + "X" * 10 + ", hereby certify", "place": "PUNE", "date": "01-06-2024"}
+    legend = [{"legend": "U", "description": "Book entry" + "", "definition": "".join(["Yes"])}]
+    return {
+        "part_a": {
+            "certificate_num": f"CERT{i}",
+            "name_and_address_of_the_employer_or_specified_bank": "".join(["ACME LTD", ", PUNE"]),
+            "verification": verification,
+            "legend_used_in_form_16": legend,
+        }
+    }
+
+
+def test_intern_shares_without_changing_output():
+    pool = InternPool()
+    first, second = pool.intern(result(1)), pool.intern(result(2))
+    assert json.dumps(first) == json.dumps(result(1))
+    assert first["part_a"]["legend_used_in_form_16"] is second["part_a"]["legend_used_in_form_16"]
+    assert first["part_a"]["verification"] is second["part_a"]["verification"]
+    employer = "name_and_address_of_the_employer_or_specified_bank"
+    assert first["part_a"][employer] is second["part_a"][employer]
+    assert first["part_a"]["certificate_num"] != second["part_a"]["certificate_num"]
@@ -0,0 +1,82 @@
+import time
+
+from form16_parser.jobs import DONE, FAILED, LEASED, PENDING, JobQueue, run_worker
+from form16_parser._exceptions import UnsupportedForm16Error
+
+
+class FakeParser:
+    def parse(self, filepath, return_output=False):
+        if filepath.endswith("old.pdf"):
+            raise UnsupportedForm16Error("too old")
+        return {"part_a": {"certificate_num": filepath}}
+
+
+def test_enqueue_is_idempotent(tmp_path):
+    with JobQueue(tmp_path / "jobs.db") as queue:
+        assert queue.enqueue(["a.pdf", "b.pdf"]) == 2
+        assert queue.enqueue(["b.pdf", "c.pdf"]) == 1
+        assert queue.progress()[PENDING] == 3
+
+
+def test_run_worker(tmp_path):
+    db = tmp_path / "jobs.db"
+    with JobQueue(db) as queue:
+        queue.enqueue(["a.pdf", "old.pdf", "b.pdf"])
+
+    assert run_worker(db, parser=FakeParser(), batch_size=2) == 3
+
+    with JobQueue(db) as queue:
+        progress = queue.progress()
+        assert (progress[DONE], progress[FAILED], progress["total"]) == (2, 1, 3)
+        assert queue.result("a.pdf")["result"] == {"part_a": {"certificate_num": "a.pdf"}}
+        assert "UnsupportedForm16Error: too old" in queue.result("old.pdf")["error"]
+        assert [path for path, _ in queue.results()] == ["a.pdf", "b.pdf"]
+
+
+def test_expired_lease_is_retried(tmp_path):
+    with JobQueue(tmp_path / "jobs.db", lease_timeout=-1, max_attempts=2) as queue:
+        queue.enqueue(["a.pdf"])
+        [(job_id, _)] = queue.lease("crashed")
+        # The crashed worker's lease has expired, so another worker gets the job
+        assert queue.lease("other") == [(job_id, "a.pdf")]
+        # The first worker cannot report on a job it no longer holds
+        assert not queue.complete(job_id, "crashed", {})
+        assert queue.complete(job_id, "other", {"ok": True})
+        assert queue.result("a.pdf")["status"] == DONE
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    with JobQueue(tmp_path / "jobs.db", lease_timeout=-1, max_attempts=1) as queue:
+        queue.enqueue(["a.pdf"])
+        assert len(queue.lease("crashed")) == 1
+        assert queue.lease("other") == []
+        assert queue.result("a.pdf")["status"] == FAILED
+        assert queue.retry_failed() == 1
+        assert queue.lease("other") != []
+        assert queue.progress()[LEASED] == 1
+
+
+class SlowParser:
+    def __init__(self, db):
+        self.db = db
+        self.stolen = None
+
+    def parse(self, filepath, return_output=False):
+        time.sleep(0.6)
+        # The lease has been renewed, another worker cannot take the job
+        with JobQueue(self.db, lease_timeout=0.2) as queue:
+            self.stolen = queue.lease("other")
+        time.sleep(0.3)
+        return {}
+
+
+def test_lease_is_renewed_during_long_parse(tmp_path):
+    db = tmp_path / "jobs.db"
+    with JobQueue(db) as queue:
+        queue.enqueue(["a.pdf"])
+
+    parser = SlowParser(db)
+    assert run_worker(db, parser=parser, lease_timeout=0.2) == 1
+    assert parser.stolen == []
+    with JobQueue(db) as queue:
+        assert queue.result("a.pdf")["status"] == DONE
@@ -0,0 +1,78 @@
+import fitz
+import pandas as pd
+
+from form16_parser import LayoutStore
+from form16_parser.layout import CLIP_PADDING, LayoutProfile
+from form16_parser.pdf import PDF
+from form16_parser.table import Table
+
+
+def make_table(bbox):
+    return Table(df=pd.DataFrame([["index", "FORM NO. 16"]]), bbox=bbox)
+
+
+def test_learn_profile():
+    profile = LayoutProfile.learn({
+        0: [make_table((20, 20, 500, 300)), make_table((20, 320, 560, 700))],
+        1: [make_table((30, 40, 400, 90))],
+        2: [],
+    })
+    assert profile.clip(0) == [20 - CLIP_PADDING, 20 - CLIP_PADDING, 560 + CLIP_PADDING, 700 + CLIP_PADDING]
+    assert profile.num_tables(0) == 2
+    assert profile.num_tables(1) == 1
+    # Pages without tables are always searched in full
+    assert profile.clip(2) is None
+
+
+def test_store_roundtrip(tmp_path):
+    filepath = tmp_path / "layouts.db"
+    profile = LayoutProfile.learn({0: [make_table((20, 20, 500, 300))]})
+    LayoutStore(filepath).put("MUMA12345B|TRACES|2024-25", profile)
+
+    store = LayoutStore(filepath)
+    loaded = store.get("MUMA12345B|TRACES|2024-25")
+    assert loaded.pages == profile.pages
+    assert loaded.strategy == profile.strategy
+    assert store.get("MUMA12345B|TRACES|2023-24") is None
+
+    store.discard("MUMA12345B|TRACES|2024-25")
+    assert LayoutStore(filepath).get("MUMA12345B|TRACES|2024-25") is None
+
+
+def test_store_merge_keeps_other_writers(tmp_path):
+    filepath = tmp_path / "layouts.db"
+    key = "MUMA12345B|TRACES|2024-25"
+    first, second = LayoutStore(filepath), LayoutStore(filepath)
+    first.merge(key, LayoutProfile.learn({0: [make_table((20, 20, 500, 300))]}))
+    second.merge(key, LayoutProfile.learn({1: [make_table((30, 40, 400, 90))]}))
+    assert set(first.get(key).pages) == {0, 1}
+
+    # A profile discarded by one worker is not brought back by another
+    first.discard(key)
+    second.merge(key, LayoutProfile.learn({2: [make_table((30, 40, 400, 90))]}))
+    assert set(first.get(key).pages) == {2}
+
+
+def ruled_table_pdf(filepath, num_rows):
+    doc = fitz.open()
+    page = doc.new_page()
+    for i in range(num_rows):
+        for x0, x1 in ((40, 200), (200, 400)):
+            rect = fitz.Rect(x0, 40 + 20 * i, x1, 60 + 20 * i)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            page.insert_textbox(rect + (2, 2, -2, -2), f"{i}-{x0}", fontsize=6)
+    doc.save(str(filepath))
+    return filepath
+
+
+def test_profile_does_not_truncate_growing_table(tmp_path):
+    pdf = PDF(ruled_table_pdf(tmp_path / "short.pdf", 5))
+    profile = LayoutProfile.learn({0: pdf.page_tables(0)})
+    pdf.clear()
+
+    pdf = PDF(ruled_table_pdf(tmp_path / "long.pdf", 15), layout=profile)
+    tables = pdf.page_tables(0)
+    pdf.clear()
+    assert len(tables) == 1
+    assert len(tables[0].rows) == 15
+    assert tables[0].rows[-1][1] == "14-40"
@@ -0,0 +1,62 @@
+import json
+
+from form16_parser.metrics import MetricsRegistry
+
+
+def make_registry(**kwargs):
+    registry = MetricsRegistry(**kwargs)
+    counter = registry.counter("form16_test_total", "Test counter.", labelnames=("exception",))
+    histogram = registry.histogram("form16_test_seconds", "Test histogram.", buckets=(0.1, 1.0))
+    return registry, counter, histogram
+
+
+def test_render():
+    registry, counter, histogram = make_registry()
+    counter.inc(exception="IndexError")
+    counter.inc(2, exception='Say "hi"')
+    histogram.observe(0.05)
+    histogram.observe(0.1)
+    histogram.observe(5)
+
+    assert registry.render().splitlines() == [
+        "# HELP form16_test_total Test counter.",
+        "# TYPE form16_test_total counter",
+        'form16_test_total{exception="IndexError"} 1',
+        'form16_test_total{exception="Say \\"hi\\""} 2',
+        "# HELP form16_test_seconds Test histogram.",
+        "# TYPE form16_test_seconds histogram",
+        'form16_test_seconds_bucket{le="0.1"} 2',
+        'form16_test_seconds_bucket{le="1"} 2',
+        'form16_test_seconds_bucket{le="+Inf"} 3',
+        "form16_test_seconds_sum 5.15",
+        "form16_test_seconds_count 3",
+    ]
+
+
+def test_multiprocess_aggregation(tmp_path):
+    # Another worker process has already written its snapshot
+    _, other_counter, other_histogram = other = make_registry()
+    other_counter.inc(3, exception="IndexError")
+    other_histogram.observe(0.5)
+    (tmp_path / "metrics_1.json").write_text(json.dumps(other[0].snapshot()))
+
+    registry, counter, histogram = make_registry(multiprocess_dir=tmp_path)
+    counter.inc(exception="IndexError")
+    histogram.observe(0.05)
+
+    text = registry.render()
+    assert 'form16_test_total{exception="IndexError"} 4' in text
+    assert 'form16_test_seconds_bucket{le="0.1"} 1' in text
+    assert 'form16_test_seconds_bucket{le="1"} 2' in text
+    assert "form16_test_seconds_count 2" in text
+
+
+def test_processes_with_the_same_pid_keep_their_snapshots(tmp_path):
+    # e.g. a worker that exited and a new one that got its pid
+    old, old_counter, _ = make_registry(multiprocess_dir=tmp_path)
+    old_counter.inc(2, exception="IndexError")
+    old.flush()
+
+    registry, counter, _ = make_registry(multiprocess_dir=tmp_path)
+    counter.inc(exception="IndexError")
+    assert 'form16_test_total{exception="IndexError"} 3' in registry.render()
@@ -0,0 +1,104 @@
+from loguru import logger
+
+from form16_parser import Parser
+from form16_parser.table import Table
+
+SECTION1 = Parser.PARTA_SECTION_HEADERS[0][0]
+SECTION2 = Parser.PARTA_SECTION_HEADERS[1][0]
+WIDTH = 7
+
+
+def make_table(cells):
+    rows = [["index", *cells[0]], *[[i, *row] for i, row in enumerate(cells[1:])]]
+    return Table(rows=[row + [None] * (WIDTH - len(row)) for row in rows])
+
+
+HEADER = [
+    ["FORM NO. 16"],
+    ["[See rule 31(1)(a)]"],
+    ["PART A"],
+    ["Certificate under Section 203 of the Income-tax Act, 1961"],
+    ["Certificate No. ABCD123", "Last updated on 01-Jun-2024"],
+    ["Name and address of the Employer", "Name and address of the Employee"],
+    ["ACME LTD", "JOHN DOE"],
+    ["PAN of the Deductor", "TAN of the Deductor", "PAN of the Employee", "Employee Reference No."],
+    ["AAACA1234A", "DELA00000A", "ABCDE1234F", "E1"],
+    ["CIT (TDS)", "Assessment Year", "Period with the Employer"],
+    ["Mumbai", "2024-25", "From\n01-Apr-2023", "To\n31-Mar-2024"],
+    ["Summary of amount paid/credited and tax deducted at source thereon in respect of the employee"],
+    ["Quarter(s)", "Receipt Numbers", "Amount paid/credited", "Tax deducted", "Tax deposited"],
+]
+
+SUMMARY = [
+    ["Q1", "R1", "250000.00", "5000.00", "5000.00"],
+    ["Q2", "R2", "250000.00", "5000.00", "5000.00"],
+    ["Total (Rs.)", "", "500000.00", "10000.00", "10000.00"],
+]
+
+SECTIONS = [
+    [SECTION1],
+    ["Sl. No.", "Tax Deposited", "Receipt Numbers", "DDO serial number", "Date", "Status"],
+    ["Total (Rs.)", "0.00"],
+    [SECTION2],
+    ["Sl. No.", "Tax Deposited", "BSR Code", "Date", "Challan Serial Number", "Status"],
+    ["1", "6000.00", "0510001", "07-07-2023", "00001", "F"],
+    ["2", "4000.00", "0510001", "07-10-2023", "00002", "F"],
+    ["Total (Rs.)", "10000.00"],
+    ["Verification"],
+    ["I, JANE DOE, certify that ..."],
+    ["Place", "Mumbai"],
+    ["Date", "01-Jun-2024"],
+    ["Designation: Manager", "Full Name: JANE DOE"],
+    ["Legend"],
+    ["Legend", "Description", "Definition"],
+    ["U", "Unmatched", "Deductors have not deposited taxes"],
+    ["F", "Final", "Payment details match"],
+]
+
+
+def parse(tables):
+    messages = []
+    handler = logger.add(messages.append, level="WARNING")
+    try:
+        return Parser().parse_a(tables), messages
+    finally:
+        logger.remove(handler)
+
+
+def check(info):
+    assert info["certificate_num"] == "ABCD123"
+    assert info["period_with_the_employer_from"] == "01-Apr-2023"
+    summary = info["summary_of_amount_paid_or_credited_and_tax_deducted"]
+    assert list(summary) == ["q1", "q2", "total"]
+    assert summary["total"]["total_amt_of_tax_deducted"] == "10000.00"
+    assert info["section_1_tax_deducted_and_deposited_through_book_adjustment"] == [{"total": "0.00"}]
+    section2 = info["section_2_tax_deducted_and_deposited_through_challan"]
+    assert [row.get("serial_num") for row in section2] == ["1", "2", None]
+    assert section2[-1] == {"total": "10000.00"}
+    assert info["verification"]["place"] == "Mumbai"
+    assert info["verification"]["full_name"] == " JANE DOE"
+    assert [row["legend"] for row in info["legend_used_in_form_16"]] == ["U", "F"]
+
+
+def test_parse_a_buckets_sections():
+    info, messages = parse([make_table(HEADER + SUMMARY + SECTIONS)])
+    check(info)
+    assert messages == []
+
+
+def test_parse_a_honeywell_summary_in_second_table():
+    # The first table stops before the summary rows
+    tables = [make_table(HEADER[:12]), make_table([HEADER[12], *SUMMARY, *SECTIONS])]
+    info, messages = parse(tables)
+    check(info)
+    assert messages == []
+
+
+def test_parse_a_repeated_heading():
+    # A heading repeated further down (e.g. on a continuation page) does not
+    # start its section again, but is reported
+    sections = SECTIONS[:-2] + [["Verification"]] + SECTIONS[-2:]
+    info, messages = parse([make_table(HEADER + SUMMARY + sections)])
+    check(info)
+    assert len(messages) == 1
+    assert "Form A Verification" in messages[0]
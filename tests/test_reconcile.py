@@ -0,0 +1,78 @@
+import copy
+
+from form16_parser.reconcile import reconcile, to_amounts
+
+
+def make_result():
+    quarter = {
+        "recieit_number": "R1",
+        "amt_paid_or_credited": "250000.00",
+        "amt_of_tax_deducted": "5000.00",
+        "amt_of_tax_deposited_or_remitted": "5000.00",
+    }
+    return {
+        "part_a": {
+            "certificate_num": "ABCD123",
+            "summary_of_amount_paid_or_credited_and_tax_deducted": {
+                "q1": quarter,
+                "q2": quarter,
+                "total": {
+                    "total_amt_paid_or_credited": "500000.00",
+                    "total_amt_of_tax_deducted": "10000.00",
+                    "total_amt_of_tax_deposited_or_remitted": "10000.00",
+                },
+            },
+            "section_1_tax_deducted_and_deposited_through_book_adjustment": [
+                {"total": "0.00"},
+            ],
+            "section_2_tax_deducted_and_deposited_through_challan": [
+                {"serial_num": "1", "tax_deposited_in_respect_of_the_deductee": "6000.00"},
+                {"serial_num": "2", "tax_deposited_in_respect_of_the_deductee": "4000.00"},
+                {"total": "10000.00"},
+            ],
+        },
+        "part_b": {
+            "certificate_num": "ABCD123",
+            "details_of_salary_paid_and_any_other_income_and_tax_deducted": {
+                "gross_salary": {
+                    "salary_as_per_provisions_contained_in_section_17_1": ["480000.00", ""],
+                    "value_of_perquisites_under_section_17_2": ["20000.00", ""],
+                    "profits_in_lieu_of_salary_under_section_17_3": ["0.00", ""],
+                    "total": "500000.00",
+                },
+                "net_tax_payable": "10000.00",
+            },
+        },
+    }
+
+
+def test_consistent_batch():
+    report = reconcile([make_result(), make_result()])
+    assert report.empty
+
+
+def test_mismatches():
+    bad = copy.deepcopy(make_result())
+    bad["part_a"]["summary_of_amount_paid_or_credited_and_tax_deducted"]["q2"] = {
+        **bad["part_a"]["summary_of_amount_paid_or_credited_and_tax_deducted"]["q2"],
+        "amt_of_tax_deducted": "4000.00",
+    }
+    bad["part_a"]["section_2_tax_deducted_and_deposited_through_challan"][-1]["total"] = "9,000.00"
+    bad["part_b"]["details_of_salary_paid_and_any_other_income_and_tax_deducted"]["gross_salary"]["total"] = "510000.00"
+
+    report = reconcile([make_result(), bad, {"part_b": {}}])
+    assert set(report["index"]) == {1}
+    assert set(report["certificate_num"]) == {"ABCD123"}
+    assert sorted(report["check"]) == [
+        "gross_salary.total",
+        "section_2.total",
+        "summary.total_amt_of_tax_deducted",
+    ]
+    row = report[report["check"]=="section_2.total"].iloc[0]
+    assert (row["expected"], row["actual"]) == (9000.0, 10000.0)
+
+
+def test_to_amounts():
+    amounts = to_amounts(["1,23,456.00", "10.5", "", None, "n/a"])
+    assert amounts[:2].tolist() == [123456.0, 10.5]
+    assert all(a != a for a in amounts[2:])
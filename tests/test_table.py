@@ -0,0 +1,46 @@
+import json
+import pickle
+
+import pandas as pd
+
+from form16_parser.table import Table
+
+
+def make_table():
+    df = pd.DataFrame([
+        ["index", "(f)", "Col2", "Col3", None],
+        [0, "(g)", "Value of perquisites", None, "1000.00"],
+    ])
+    return Table(df=df, page_number=3, bbox=(20.0, 40.0, 570.0, 300.0))
+
+
+def test_rows():
+    table = make_table()
+    assert table.first_table_cell == "(f)"
+    assert table.first_table_column == ["(f)", "(g)"]
+    assert table.compact_rows == [
+        ["index", "(f)", "Col2", "Col3"],
+        [0, "(g)", "Value of perquisites", "1000.00"],
+    ]
+    assert table.normalized_rows == [
+        ["index", "(f)", "", ""],
+        [0, "(g)", "Value of perquisites", "1000.00"],
+    ]
+
+
+def test_pickle_roundtrip():
+    table = make_table()
+    loaded = pickle.loads(pickle.dumps(table))
+    assert loaded.page_number == 3
+    assert loaded.bbox == table.bbox
+    assert loaded.rows == table.rows
+    assert loaded.normalized_rows == table.normalized_rows
+    assert loaded.fingerprint == table.fingerprint
+
+
+def test_dict_roundtrip():
+    table = make_table()
+    loaded = Table.from_dict(json.loads(json.dumps(table.to_dict())))
+    assert loaded.rows == table.rows
+    assert loaded.bbox == table.bbox
+    assert loaded.dataframe.equals(table.dataframe)